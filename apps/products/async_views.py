@@ -0,0 +1,86 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import (APIException, AuthenticationFailed,
+                                       NotAuthenticated, PermissionDenied)
+
+from marketplace.authentication import CachedJWTAuthentication
+from marketplace.renderers import FastJSONRenderer
+
+from .cache import acached_response
+from .views import PartDetailView, PartListView
+
+
+class AsyncReadView(View):
+    """
+    Atende as leituras (GET) de uma view DRF sem bloquear o event loop:
+    autenticação JWT, consulta e cache usam as APIs assíncronas do Django e
+    dos backends. Os demais métodos seguem para a view DRF síncrona.
+
+    Usada quando o projeto roda sob ASGI (``PARTS_ASYNC_VIEWS=1``), para que
+    um worker atenda muitos clientes lentos ou com keep-alive ao mesmo tempo.
+    """
+    drf_view_class = None
+    cache_name = None
+    build_method = None
+    authentication = CachedJWTAuthentication()
+    sync_view = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        initkwargs.setdefault('sync_view', sync_to_async(cls.drf_view_class.as_view()))
+        view = csrf_exempt(super().as_view(**initkwargs))
+        # Documentada no schema (drf-spectacular) como a view DRF original
+        view.cls = cls.drf_view_class
+        view.initkwargs = {}
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            return await self.sync_view(request, *args, **kwargs)
+        return await self.get(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        view = self.drf_view_class(args=args, kwargs=kwargs, format_kwarg=None, headers={})
+        view.request = view.initialize_request(request, *args, **kwargs)
+        try:
+            await self.check_access(view)
+            return await acached_response(view.request, self.cache_name, getattr(view, self.build_method))
+        except APIException as exc:
+            return self.error_response(exc)
+
+    async def check_access(self, view):
+        request = view.request
+        result = await self.authentication.aauthenticate(request)
+        if result is None:
+            raise NotAuthenticated
+        request.user, request.auth = result
+
+        for permission in view.get_permissions():
+            if not permission.has_permission(request, view):
+                raise PermissionDenied(getattr(permission, 'message', None))
+
+    def error_response(self, exc):
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = HttpResponse(
+            FastJSONRenderer().render(data),
+            status=exc.status_code,
+            content_type='application/json',
+        )
+        if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+            response.status_code = 401
+            response['WWW-Authenticate'] = self.authentication.authenticate_header(None)
+        return response
+
+
+class AsyncPartListView(AsyncReadView):
+    drf_view_class = PartListView
+    cache_name = 'list'
+    build_method = 'abuild_list_data'
+
+
+class AsyncPartDetailView(AsyncReadView):
+    drf_view_class = PartDetailView
+    cache_name = 'detail'
+    build_method = 'abuild_detail_data'
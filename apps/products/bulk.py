@@ -0,0 +1,186 @@
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from rest_framework.serializers import ValidationError, as_serializer_error
+
+from .cache import invalidate_parts_cache
+from .importers import upsert_parts
+from .models import Part
+from .serializers import PartBulkItemSerializer, PartBulkOperationSerializer
+from .tasks import request_replenishment
+
+BULK_UPDATE_BATCH_SIZE = 1000
+# Colunas gravadas pelo upsert; os demais campos de uma criação vão depois
+UPSERT_FIELDS = {"name", "description", "price", "quantity"}
+DUPLICATE_KEY_MESSAGE = "Já existe uma peça com este nome e preço."
+
+
+def apply_bulk_operations(operations):
+    """
+    Valida todas as operações de criação, atualização e remoção de peças e,
+    somente se nenhuma tiver erro, aplica todas em uma única transação com
+    ``INSERT ... ON CONFLICT``, ``UPDATE ... FROM (VALUES ...)`` e um único
+    DELETE. Criar uma peça cuja chave (name, price) já existe atualiza a peça
+    existente.
+
+    Retorna a lista de resultados por item (na ordem recebida) e um booleano
+    indicando se o lote foi aplicado.
+    """
+    results = [None] * len(operations)
+    parsed = []
+    seen_ids = set()
+    # Uma instância de cada serializer para o lote todo: montar os campos
+    # por item custaria mais do que a própria validação
+    op_validator = PartBulkOperationSerializer()
+    create_validator = PartBulkItemSerializer()
+    update_validator = PartBulkItemSerializer(partial=True)
+
+    for index, raw in enumerate(operations):
+        try:
+            op = op_validator.run_validation(raw)
+        except ValidationError as exc:
+            results[index] = _error(index, raw.get("op"), as_serializer_error(exc))
+            continue
+
+        if "id" in op:
+            if op["id"] in seen_ids:
+                results[index] = _error(index, op["op"], {"id": ["Peça repetida no mesmo lote."]})
+                continue
+            seen_ids.add(op["id"])
+        parsed.append((index, op))
+
+    with transaction.atomic():
+        # Trava as peças envolvidas em ordem de id para evitar deadlocks e
+        # para que a atualização em lote não sobrescreva escritas concorrentes
+        queryset = Part.objects.select_for_update().filter(id__in=seen_ids).order_by("id")
+        instances = {part.id: part for part in queryset}
+
+        to_create = []
+        create_extra_fields = {}
+        to_update = []
+        to_delete = []
+        update_fields = set()
+        create_keys = set()
+        rekeyed = set()
+
+        for index, op in parsed:
+            if op["op"] != "create" and op["id"] not in instances:
+                results[index] = _error(index, op["op"], {"id": ["Peça não encontrada."]})
+                continue
+
+            if op["op"] == "delete":
+                to_delete.append((index, op["id"]))
+                continue
+
+            validator = create_validator if op["op"] == "create" else update_validator
+            try:
+                validated_data = validator.run_validation(op["data"])
+            except ValidationError as exc:
+                results[index] = _error(index, op["op"], as_serializer_error(exc))
+                continue
+
+            if op["op"] == "create":
+                part = Part(**validated_data)
+                key = (part.name, part.price)
+                if key in create_keys:
+                    results[index] = _error(index, "create", {"non_field_errors": [DUPLICATE_KEY_MESSAGE]})
+                    continue
+                create_keys.add(key)
+                to_create.append((index, part))
+                create_extra_fields[index] = validated_data.keys() - UPSERT_FIELDS
+            else:
+                instance = instances[op["id"]]
+                for field, value in validated_data.items():
+                    setattr(instance, field, value)
+                update_fields.update(validated_data)
+                to_update.append((index, instance))
+                if "name" in validated_data or "price" in validated_data:
+                    rekeyed.add(index)
+
+        if any(result is not None for result in results):
+            for index, op in parsed:
+                if results[index] is None:
+                    results[index] = {"index": index, "op": op["op"], "status": "valid"}
+            return results, False
+
+        try:
+            with transaction.atomic():
+                # Remoções antes, para que a chave de uma peça removida possa
+                # ser reaproveitada no mesmo lote
+                if to_delete:
+                    Part.objects.filter(id__in=[pk for _, pk in to_delete]).delete()
+                if to_update:
+                    now = timezone.now()
+                    for _, instance in to_update:
+                        instance.updated_at = now
+                    _update_from_values(
+                        [instance for _, instance in to_update],
+                        sorted(update_fields | {"updated_at"}),
+                    )
+                upserted = upsert_parts([
+                    (part.name, part.description, part.price, part.quantity)
+                    for _, part in to_create
+                ])
+                for (_, part), (pk, _) in zip(to_create, upserted):
+                    part.pk = pk
+                for field in sorted(set().union(*create_extra_fields.values())):
+                    _update_from_values(
+                        [part for index, part in to_create if field in create_extra_fields[index]],
+                        [field],
+                    )
+        except IntegrityError:
+            # Alguma atualização levou a peça para uma chave já usada
+            for index, op in parsed:
+                if index in rekeyed:
+                    results[index] = _error(index, "update", {"non_field_errors": [DUPLICATE_KEY_MESSAGE]})
+                else:
+                    results[index] = {"index": index, "op": op["op"], "status": "valid"}
+            return results, False
+        invalidate_parts_cache()
+        # A reposição só percorre as peças abaixo do mínimo
+        if to_create or update_fields & {"quantity", "minimum_quantity"}:
+            request_replenishment()
+
+    for (index, _), (pk, created) in zip(to_create, upserted):
+        results[index] = {"index": index, "op": "create", "status": "created" if created else "updated", "id": pk}
+    for index, part in to_update:
+        results[index] = {"index": index, "op": "update", "status": "updated", "id": part.id}
+    for index, pk in to_delete:
+        results[index] = {"index": index, "op": "delete", "status": "deleted", "id": pk}
+    return results, True
+
+
+def _update_from_values(parts, field_names):
+    """
+    Equivalente ao ``bulk_update`` usando ``UPDATE ... FROM (VALUES ...)``.
+
+    O ``bulk_update`` do Django monta um CASE WHEN por campo e por linha, cujo
+    custo de compilação domina lotes com milhares de peças.
+    """
+    opts = Part._meta
+    quote = connection.ops.quote_name
+    columns = [opts.pk] + [opts.get_field(name) for name in field_names]
+
+    column_names = ", ".join(quote(field.column) for field in columns)
+    assignments = ", ".join(
+        f"{quote(field.column)} = v.{quote(field.column)}" for field in columns[1:]
+    )
+    row = "(" + ", ".join(f"%s::{field.db_type(connection)}" for field in columns) + ")"
+
+    with connection.cursor() as cursor:
+        for start in range(0, len(parts), BULK_UPDATE_BATCH_SIZE):
+            batch = parts[start:start + BULK_UPDATE_BATCH_SIZE]
+            params = [
+                field.get_db_prep_save(getattr(part, field.attname), connection)
+                for part in batch
+                for field in columns
+            ]
+            cursor.execute(
+                f"UPDATE {quote(opts.db_table)} AS t SET {assignments} "
+                f"FROM (VALUES {', '.join([row] * len(batch))}) AS v ({column_names}) "
+                f"WHERE t.{quote(opts.pk.column)} = v.{quote(opts.pk.column)}",
+                params,
+            )
+
+
+def _error(index, op, errors):
+    return {"index": index, "op": op, "status": "error", "errors": errors}
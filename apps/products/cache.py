@@ -0,0 +1,111 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework import status
+from rest_framework.response import Response
+
+from marketplace.renderers import FastJSONRenderer
+
+VERSION_KEY = 'parts:version'
+
+
+def get_version():
+    """
+    Versão atual do catálogo. Toda chave de cache de peças inclui essa versão,
+    então incrementá-la invalida de uma vez listagens e detalhes.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Parte do relógio para não reaproveitar versões antigas caso a chave
+        # tenha sido removida do Redis
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def aget_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns(), timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_parts_cache():
+    """
+    Invalida o cache de peças quando a transação corrente for confirmada
+    (imediatamente, se não houver transação aberta).
+    """
+    transaction.on_commit(bump_version)
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = {value.strip() for value in header.split(',')}
+    return '*' in candidates or etag in candidates
+
+
+def cached_response(request, name, build):
+    """
+    Retorna a resposta de ``build()`` usando o cache versionado do catálogo.
+
+    Se o cliente já possui a versão atual (``If-None-Match``), responde 304.
+    O 304 só sai depois que a resposta dessa versão foi montada (e está em
+    cache, então em geral sem consultar o banco): uma peça inexistente ou
+    filtros inválidos continuam respondendo 404/400, mesmo com o ETag da
+    versão atual.
+    """
+    version = get_version()
+    etag = f'W/"{version}"'
+
+    key = cache_key(request, version, name)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, timeout=settings.PARTS_CACHE_TIMEOUT)
+
+    if etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return Response(data, headers={'ETag': etag})
+
+
+async def acached_response(request, name, build):
+    """
+    Versão assíncrona de ``cached_response`` para as views async: ``build``
+    é uma corrotina e a resposta já sai renderizada em JSON. Usa as mesmas
+    chaves de cache das views síncronas.
+    """
+    version = await aget_version()
+    etag = f'W/"{version}"'
+
+    key = cache_key(request, version, name)
+    data = await cache.aget(key)
+    if data is None:
+        data = await build()
+        await cache.aset(key, data, timeout=settings.PARTS_CACHE_TIMEOUT)
+
+    if etag_matches(request, etag):
+        return HttpResponseNotModified(headers={'ETag': etag})
+    return HttpResponse(
+        FastJSONRenderer().render(data),
+        content_type='application/json',
+        headers={'ETag': etag},
+    )
+
+
+def cache_key(request, version, name):
+    digest = hashlib.sha1(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f'parts:{version}:{name}:{digest}'
@@ -0,0 +1,171 @@
+import json
+from base64 import b64decode, b64encode
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, NotFound
+
+from .models import Part, PartChange
+from .serializers import PartDetailSerializer, compile_row_converter
+
+INVALID_CURSOR_MESSAGE = 'Cursor inválido.'
+
+# Posições no feed: ('scan', watermark, último id) durante a carga inicial,
+# que percorre as peças por id, e ('log', txid, id) no registro de alterações
+SCAN = 'scan'
+LOG = 'log'
+
+# Menor transação ainda em andamento: as anteriores já terminaram
+CURRENT_XMIN = 'pg_snapshot_xmin(pg_current_snapshot())::text::bigint'
+
+_convert_part = None
+_datetime_field = serializers.DateTimeField()
+
+
+class CursorExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = (
+        'Cursor mais antigo que o histórico de alterações mantido. '
+        'Sincronize o catálogo completo novamente.'
+    )
+    default_code = 'cursor_expired'
+
+
+def encode_cursor(position):
+    data = json.dumps(list(position), separators=(',', ':')).encode('utf-8')
+    return b64encode(data, altchars=b'-_').decode('ascii')
+
+
+def decode_cursor(encoded):
+    """
+    Converte o cursor recebido em ``since`` na posição a partir da qual as
+    alterações ainda não foram entregues.
+    """
+    try:
+        kind, first, second = json.loads(b64decode(encoded.encode('ascii'), altchars=b'-_', validate=True))
+        position = (kind, int(first), int(second))
+    except (TypeError, ValueError, UnicodeError):
+        raise NotFound(INVALID_CURSOR_MESSAGE)
+    if kind not in (SCAN, LOG):
+        raise NotFound(INVALID_CURSOR_MESSAGE)
+    return position
+
+
+def after(queryset, first_field, second_field, position):
+    """
+    Filtra as linhas com chave (first_field, second_field) maior que
+    ``position``, em ordem de chave, para percorrer o índice correspondente.
+    """
+    queryset = queryset.order_by(first_field, second_field)
+    first, second = position
+    return (
+        queryset.filter(**{f'{first_field}__gte': first})
+        .exclude(**{first_field: first, f'{second_field}__lte': second})
+    )
+
+
+def get_changes(position, limit):
+    """
+    Peças criadas ou alteradas e peças removidas depois de ``position``, até
+    ``limit`` itens no total.
+
+    Sem ``position`` o feed começa pela carga inicial: o catálogo inteiro em
+    ordem de id, com a marca d'água (xmin) do início da carga. Terminada a
+    carga, segue pelo registro de alterações a partir da marca d'água, então
+    nada alterado durante a carga fica de fora.
+
+    O registro é lido em ordem de (txid, id) e só até a transação mais
+    antiga ainda em andamento, que pode confirmar depois alterações com
+    posição anterior às já visíveis. Quando tudo o que terminou foi
+    entregue, o cursor avança até essa transação, mesmo sem alterações.
+
+    Retorna as peças (como ``PartDetailSerializer``, no estado atual), as
+    remoções (``{id, deleted_at}``), a posição seguinte e se há mais itens.
+    """
+    global _convert_part
+    if _convert_part is None:
+        _convert_part = compile_row_converter(PartDetailSerializer)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {CURRENT_XMIN}, '
+            f'(SELECT ARRAY[txid, id] FROM {PartChange._meta.db_table} WHERE part_id IS NULL LIMIT 1)'
+        )
+        xmin, horizon = cursor.fetchone()
+
+    changed = []
+    kind, first, second = position or (SCAN, xmin, 0)
+    if kind == SCAN:
+        parts = Part.objects.filter(id__gt=second).order_by('id')
+        rows = list(parts.values(*PartDetailSerializer().fields)[:limit + 1])
+        if len(rows) > limit:
+            return [_convert_part(row) for row in rows[:limit]], [], (SCAN, first, rows[limit - 1]['id']), True
+        changed = [_convert_part(row) for row in rows]
+        limit -= len(changed)
+        kind, second = LOG, 0
+        if limit == 0:
+            return changed, [], (kind, first, second), True
+
+    if horizon is not None and (first, second) < tuple(horizon):
+        raise CursorExpired
+
+    entries = list(
+        after(PartChange.objects.filter(txid__lt=xmin, part_id__isnull=False), 'txid', 'id', (first, second))
+        .values_list('txid', 'id', 'part_id', 'deleted', 'recorded_at')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if entries:
+        first, second = entries[-1][:2]
+    if not has_more and xmin > first:
+        first, second = xmin, 0
+
+    # Cada peça aparece uma vez, no estado atual, na posição da última
+    # alteração da página. Peças que já não existem só aparecem como
+    # removidas na própria remoção
+    latest = {}
+    for _, _, part_id, removed, recorded_at in entries:
+        latest.pop(part_id, None)
+        latest[part_id] = (removed, recorded_at)
+    parts = {
+        row['id']: row
+        for row in Part.objects.filter(id__in=[pk for pk, (removed, _) in latest.items() if not removed])
+        .values(*PartDetailSerializer().fields)
+    }
+    deleted = []
+    for pk, (removed, recorded_at) in latest.items():
+        if pk in parts:
+            changed.append(_convert_part(parts[pk]))
+        elif removed:
+            deleted.append({'id': pk, 'deleted_at': _datetime_field.to_representation(recorded_at)})
+    return changed, deleted, (LOG, first, second), has_more
+
+
+def purge_changes():
+    """
+    Apaga as alterações mais antigas que ``PARTS_CHANGES_RETENTION_DAYS``. A
+    última delas fica como marco (``part_id`` nulo); cursores anteriores a
+    esse marco passam a receber 410.
+    """
+    table = PartChange._meta.db_table
+    limit = timezone.now() - timedelta(days=settings.PARTS_CHANGES_RETENTION_DAYS)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH horizon AS (
+                SELECT txid, id FROM {table}
+                WHERE recorded_at < %s AND txid < {CURRENT_XMIN}
+                ORDER BY txid DESC, id DESC
+                LIMIT 1
+            ),
+            marked AS (
+                UPDATE {table} AS c SET part_id = NULL FROM horizon WHERE c.id = horizon.id
+            )
+            DELETE FROM {table} AS c USING horizon WHERE (c.txid, c.id) < (horizon.txid, horizon.id)
+            """,
+            [limit],
+        )
+        return cursor.rowcount
@@ -0,0 +1,93 @@
+import csv
+
+import orjson
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Part
+
+CSV_HEADER = ("nome", "descricao", "preco", "quantidade")
+EXPORT_FIELDS = ("id", "name", "description", "price", "quantity")
+
+
+class Echo:
+    """
+    Objeto "arquivo" cujo ``write`` apenas devolve a linha, para usar o
+    ``csv.writer`` sem acumular o conteúdo em memória.
+    """
+    def write(self, value):
+        return value
+
+
+def iter_parts(chunk_size=None):
+    """
+    Percorre o catálogo em ordem de id por um cursor no servidor, trazendo
+    ``chunk_size`` linhas por vez.
+    """
+    chunk_size = chunk_size or settings.PARTS_EXPORT_CHUNK_SIZE
+    queryset = Part.objects.order_by("id").values_list(*EXPORT_FIELDS)
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def _batched(lines, chunk_size, separator):
+    # Agrupa as linhas para não enviar um pedaço de resposta por peça
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= chunk_size:
+            yield separator.join(buffer)
+            buffer = []
+    if buffer:
+        yield separator.join(buffer)
+
+
+def export_csv(chunk_size=None):
+    """
+    Gera o catálogo em CSV com as mesmas colunas aceitas pela importação.
+    O cabeçalho é enviado antes da consulta ao banco.
+    """
+    chunk_size = chunk_size or settings.PARTS_EXPORT_CHUNK_SIZE
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    lines = (
+        writer.writerow((name, description, f"{price:.2f}", quantity))
+        for _, name, description, price, quantity in iter_parts(chunk_size)
+    )
+    yield from _batched(lines, chunk_size, "")
+
+
+def export_ndjson(chunk_size=None):
+    """
+    Gera o catálogo em NDJSON, uma peça por linha, no formato da listagem.
+    """
+    chunk_size = chunk_size or settings.PARTS_EXPORT_CHUNK_SIZE
+    lines = (
+        orjson.dumps({
+            "id": pk,
+            "name": name,
+            "description": description,
+            "price": f"{price:.2f}",
+            "quantity": quantity,
+        }) + b"\n"
+        for pk, name, description, price, quantity in iter_parts(chunk_size)
+    )
+    yield from _batched(lines, chunk_size, b"")
+
+
+async def astream(chunks):
+    """
+    Entrega os pedaços de ``chunks`` como iterador assíncrono, para que sob
+    ASGI a resposta siga em streaming (com um iterador síncrono o Django lê
+    o arquivo inteiro para a memória antes de enviar).
+
+    Cada pedaço é gerado na thread síncrona da requisição, a mesma em que a
+    view abriu o cursor no servidor, e o event loop fica livre entre eles.
+    """
+    done = object()
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(chunks, done)) is not done:
+            yield chunk
+    finally:
+        # Cliente desconectado no meio: fecha o cursor na mesma thread
+        await sync_to_async(chunks.close, thread_sensitive=True)()
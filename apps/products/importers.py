@@ -0,0 +1,537 @@
+import csv
+import gzip
+import hashlib
+import io
+import os
+import tempfile
+import zlib
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+from itertools import islice, repeat
+from operator import itemgetter, ne
+
+import orjson
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.utils import timezone
+
+from .cache import invalidate_parts_cache
+from .models import Part
+
+SHARD_FIELDS = ("name", "description", "price", "quantity")
+# Extensões aceitas na importação; ``.gz`` é descompactado pelo worker
+IMPORT_FORMATS = (".csv", ".csv.gz", ".ndjson", ".ndjson.gz")
+REPORT_HEADER = ("linha", "coluna", "motivo")
+
+# Limites dos campos do modelo, verificados antes de chegar ao banco
+NAME_MAX_LENGTH = Part._meta.get_field("name").max_length
+_price_field = Part._meta.get_field("price")
+PRICE_QUANTUM = Decimal(1).scaleb(-_price_field.decimal_places)
+PRICE_LIMIT = Decimal(10) ** (_price_field.max_digits - _price_field.decimal_places)
+QUANTITY_MIN, QUANTITY_MAX = connection.ops.integer_field_range(
+    Part._meta.get_field("quantity").get_internal_type()
+)
+DUPLICATE_KEY_REASON = "Chave (nome, preco) repetida no arquivo; prevalece a última ocorrência."
+
+
+def check_name(value):
+    if not value:
+        return None, "Nome obrigatório."
+    if len(value) > NAME_MAX_LENGTH:
+        return None, f"Nome com mais de {NAME_MAX_LENGTH} caracteres."
+    return value, None
+
+
+def parse_price(value):
+    """
+    Converte o preço em ``Decimal`` sem arredondar: valores com mais casas
+    decimais ou dígitos do que o campo comporta são rejeitados.
+    """
+    try:
+        price = Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return None, "Preço inválido."
+    if not price.is_finite():
+        return None, "Preço inválido."
+    if abs(price) >= PRICE_LIMIT:
+        return None, f"Preço fora do limite (menor que {PRICE_LIMIT})."
+    exact = price.quantize(PRICE_QUANTUM)
+    if exact != price:
+        return None, f"Preço com mais de {_price_field.decimal_places} casas decimais."
+    return exact, None
+
+
+def parse_quantity(value):
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        return None, "Quantidade deve ser um número inteiro."
+    if not QUANTITY_MIN <= quantity <= QUANTITY_MAX:
+        return None, f"Quantidade fora do intervalo de {QUANTITY_MIN} a {QUANTITY_MAX}."
+    return quantity, None
+
+
+def read_column(rows, key, alias, default):
+    """
+    Extrai uma coluna aceitando o cabeçalho em inglês (``key``) ou em
+    português (``alias``). O caso comum, um só cabeçalho no lote inteiro,
+    não passa por laço Python.
+    """
+    values = list(map(dict.get, rows, repeat(key)))
+    if all(values):
+        return values
+    aliases = list(map(dict.get, rows, repeat(alias)))
+    if not any(values) and all(aliases):
+        return aliases
+    return [value or other or default for value, other in zip(values, aliases)]
+
+
+def parse_prices(values):
+    """
+    ``parse_price`` para uma coluna inteira, sem laço Python. Retorna
+    ``None`` se algum valor não passar, para que a coluna seja refeita valor
+    a valor e cada problema ganhe o seu motivo.
+    """
+    try:
+        prices = list(map(Decimal, values))
+        exact = list(map(Decimal.quantize, prices, repeat(PRICE_QUANTUM)))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    if exact and (any(map(ne, exact, prices)) or max(map(abs, exact)) >= PRICE_LIMIT):
+        return None
+    return exact
+
+
+def parse_quantities(values):
+    """
+    ``parse_quantity`` para uma coluna inteira, nos moldes de ``parse_prices``.
+    """
+    try:
+        quantities = list(map(int, values))
+    except (TypeError, ValueError):
+        return None
+    if quantities and (min(quantities) < QUANTITY_MIN or max(quantities) > QUANTITY_MAX):
+        return None
+    return quantities
+
+
+def convert_column(values, convert, convert_all):
+    """
+    Converte cada valor distinto da coluna uma única vez (preços e
+    quantidades se repetem muito dentro de um lote), primeiro todos de uma
+    vez com ``convert_all`` e, se algum falhar, um a um com ``convert``.
+    Devolve os valores convertidos e os índices rejeitados com o motivo.
+    """
+    distinct = list(set(values))
+    converted = convert_all(distinct)
+    if converted is not None:
+        converted = dict(zip(distinct, converted))
+        return list(map(converted.__getitem__, values)), {}
+
+    results = {value: convert(value) for value in distinct}
+    failures = {value: reason for value, (_, reason) in results.items() if reason is not None}
+    converted = {value: result for value, (result, _) in results.items()}
+    rejected = {index: failures[value] for index, value in enumerate(values) if value in failures}
+    return list(map(converted.__getitem__, values)), rejected
+
+
+def check_names(names):
+    if all(names) and max(map(len, names)) <= NAME_MAX_LENGTH:
+        return names, {}
+    return convert_column(names, check_name, lambda values: None)
+
+
+def find_duplicate_keys(names, prices, seen_keys):
+    """
+    Índices cuja chave (name, price) já apareceu no arquivo. ``seen_keys``
+    mapeia nome -> preço (ou conjunto de preços, se o nome se repete) e é
+    atualizado aqui. Nomes inéditos, o caso comum, são registrados de uma vez.
+    """
+    if seen_keys.keys().isdisjoint(names) and len(set(names)) == len(names):
+        seen_keys.update(zip(names, prices))
+        return []
+
+    duplicates = []
+    for index, (name, price) in enumerate(zip(names, prices)):
+        known = seen_keys.get(name)
+        if known is None:
+            seen_keys[name] = price
+        elif isinstance(known, set):
+            if price in known:
+                duplicates.append(index)
+            else:
+                known.add(price)
+        elif known == price:
+            duplicates.append(index)
+        else:
+            seen_keys[name] = {known, price}
+    return duplicates
+
+
+def validate_chunk(rows, seen_keys):
+    """
+    Valida em bloco um lote de pares (linha, dicionário), coluna a coluna,
+    aceitando cabeçalhos em inglês ou português: nome obrigatório dentro do
+    tamanho do campo, preço decimal exato dentro de ``max_digits`` e
+    quantidade inteira no intervalo do campo. Chaves (name, price) já vistas
+    no arquivo (``seen_keys``, atualizado aqui) são apontadas no relatório,
+    mas seguem para a gravação, onde a última ocorrência prevalece.
+
+    Retorna as tuplas (name, description, price, quantity) válidas, na ordem
+    do arquivo, a lista de erros (linha, coluna, motivo) e a quantidade de
+    linhas rejeitadas.
+    """
+    lines = list(map(itemgetter(0), rows))
+    items = list(map(itemgetter(1), rows))
+    names, bad_names = check_names(read_column(items, "name", "nome", None))
+    descriptions = read_column(items, "description", "descricao", "")
+    prices, bad_prices = convert_column(read_column(items, "price", "preco", 0), parse_price, parse_prices)
+    quantities, bad_quantities = convert_column(
+        read_column(items, "quantity", "quantidade", 0), parse_quantity, parse_quantities
+    )
+
+    errors = []
+    for column, rejected in (("nome", bad_names), ("preco", bad_prices), ("quantidade", bad_quantities)):
+        errors.extend((lines[index], column, reason) for index, reason in rejected.items())
+    rejected = bad_names.keys() | bad_prices.keys() | bad_quantities.keys()
+
+    columns = (names, descriptions, prices, quantities)
+    if rejected:
+        kept = [index for index in range(len(lines)) if index not in rejected]
+        lines = [lines[index] for index in kept]
+        columns = [[column[index] for index in kept] for column in columns]
+
+    names, _, prices, _ = columns
+    errors.extend((lines[index], "nome", DUPLICATE_KEY_REASON)
+                  for index in find_duplicate_keys(names, prices, seen_keys))
+    errors.sort(key=lambda error: error[0])
+    return list(zip(*columns)), errors, len(rejected)
+
+
+def validate_rows(rows, batch_size, report=None):
+    """
+    Valida um iterável de pares (linha, dicionário) em lotes de
+    ``batch_size`` e gera, por lote, as tuplas válidas e a quantidade de
+    linhas rejeitadas. Os problemas encontrados vão para ``report``.
+    """
+    seen_keys = {}
+    rows = iter(rows)
+    while chunk := list(islice(rows, batch_size)):
+        valid, errors, rejected = validate_chunk(chunk, seen_keys)
+        if report is not None:
+            report.add(errors)
+        yield valid, rejected
+
+
+class ErrorReport:
+    """
+    Relatório CSV (linha, coluna, motivo) dos problemas encontrados em uma
+    importação. As linhas vão para um arquivo temporário e só chegam ao
+    storage, em ``save``, se houver algum problema.
+    """
+
+    def __init__(self):
+        self.text = io.TextIOWrapper(tempfile.TemporaryFile(), encoding="utf-8", newline="")
+        self.writer = csv.writer(self.text)
+        self.writer.writerow(REPORT_HEADER)
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.text.close()
+
+    def add(self, errors):
+        self.writer.writerows(errors)
+        self.count += len(errors)
+
+    def save(self, name):
+        """
+        Salva o relatório no storage e retorna o nome do arquivo, ou uma
+        string vazia quando não houve problemas.
+        """
+        if not self.count:
+            return ""
+        self.text.flush()
+        self.text.buffer.seek(0)
+        return default_storage.save(name, File(self.text.buffer, name=name))
+
+
+def import_format(file_name):
+    """
+    Retorna a extensão de importação de ``file_name`` (ex.: ``.csv.gz``) ou
+    ``None`` quando o formato não é aceito.
+    """
+    name = file_name.lower()
+    return next((suffix for suffix in IMPORT_FORMATS if name.endswith(suffix)), None)
+
+
+def file_checksum(file):
+    """
+    SHA-256 do conteúdo de um arquivo enviado, lido em blocos.
+    """
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def open_staged(file_path):
+    """
+    Abre um arquivo do storage em modo binário, descompactando ``.gz`` em
+    fluxo, sem carregá-lo inteiro em memória.
+    """
+    with default_storage.open(file_path, "rb") as raw:
+        if file_path.lower().endswith(".gz"):
+            with gzip.GzipFile(fileobj=raw, mode="rb") as stream:
+                yield stream
+        else:
+            yield raw
+
+
+def is_ndjson(file_path):
+    return (import_format(file_path) or "").startswith(".ndjson")
+
+
+def count_staged_rows(file_path):
+    """
+    Estima a quantidade de linhas de dados de um arquivo do storage contando
+    quebras de linha, sem interpretar o CSV ou o JSON.
+    """
+    lines = 0
+    last = b"\n"
+    with open_staged(file_path) as stream:
+        for block in iter(lambda: stream.read(1024 * 1024), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    # O NDJSON não tem cabeçalho
+    return lines if is_ndjson(file_path) else max(lines - 1, 0)
+
+
+def iter_staged_rows(file_path):
+    """
+    Percorre linha a linha um arquivo salvo no storage (CSV ou NDJSON,
+    compactados ou não) sem carregá-lo inteiro em memória, gerando pares
+    (número da linha no arquivo, dicionário).
+    """
+    with open_staged(file_path) as stream:
+        with io.TextIOWrapper(stream, encoding="utf-8-sig", newline="") as text:
+            if is_ndjson(file_path):
+                yield from iter_ndjson_rows(text)
+            else:
+                yield from iter_csv_rows(text)
+
+
+def iter_csv_rows(text):
+    reader = csv.DictReader(text)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def iter_ndjson_rows(lines):
+    """
+    Converte cada objeto JSON em um dicionário de textos, como os do
+    ``csv.DictReader``, para que a validação trate os dois formatos da
+    mesma forma. Linhas que não são um objeto JSON viram dicionários vazios
+    (rejeitadas por falta de nome).
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            item = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            item = None
+        if not isinstance(item, dict):
+            yield line_number, {}
+            continue
+        yield line_number, {key: "" if value is None else str(value) for key, value in item.items()}
+
+
+def shard_for(name, price, shards):
+    """
+    Escolhe o shard de uma chave (name, price) de forma estável entre
+    processos, para que todas as ocorrências da chave caiam no mesmo shard.
+    """
+    return zlib.crc32(f"{name}\x1f{price}".encode("utf-8")) % shards
+
+
+def split_into_shards(file_path, shards, report=None):
+    """
+    Divide um arquivo do storage em até ``shards`` CSVs normalizados.
+
+    As linhas são distribuídas pelo hash da chave natural e mantêm a ordem
+    original dentro de cada shard, de modo que chaves repetidas continuam
+    sendo resolvidas pela última ocorrência mesmo com shards em paralelo.
+    As linhas são validadas aqui, com os problemas enviados para ``report``;
+    os shards só recebem linhas válidas. Retorna a lista de arquivos gerados,
+    a quantidade de linhas distribuídas e a quantidade de linhas ignoradas.
+    """
+    suffix = import_format(file_path)
+    base = file_path[:-len(suffix)] if suffix else os.path.splitext(file_path)[0]
+    buffers = [None] * shards
+    rows = 0
+    skipped = 0
+
+    try:
+        batches = validate_rows(iter_staged_rows(file_path), settings.PARTS_IMPORT_BATCH_SIZE, report)
+        for valid, rejected in batches:
+            skipped += rejected
+            rows += len(valid)
+            for parsed in valid:
+                index = shard_for(parsed[0], parsed[2], shards)
+                if buffers[index] is None:
+                    raw = tempfile.TemporaryFile()
+                    text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+                    writer = csv.writer(text)
+                    writer.writerow(SHARD_FIELDS)
+                    buffers[index] = (text, writer)
+                buffers[index][1].writerow(parsed)
+
+        shard_paths = []
+        for index, buffer in enumerate(buffers):
+            if buffer is None:
+                continue
+            text, _ = buffer
+            text.flush()
+            shard_name = f"{base}.shard{index}.csv"
+            shard_paths.append(
+                default_storage.save(shard_name, File(text.buffer, name=shard_name))
+            )
+    finally:
+        for buffer in buffers:
+            if buffer is not None:
+                buffer[0].close()
+
+    return shard_paths, rows, skipped
+
+
+def merge_results(results, skipped=0):
+    """
+    Soma os resultados parciais de cada shard no mesmo formato retornado por
+    ``import_rows``.
+    """
+    merged = {
+        key: sum(result[key] for result in results)
+        for key in ("created", "updated", "unchanged", "skipped")
+    }
+    merged["skipped"] += skipped
+    merged["total"] = sum(merged.values())
+    return merged
+
+
+def upsert_parts(rows, skip_unchanged=False):
+    """
+    Grava tuplas (name, description, price, quantity) com um único
+    ``INSERT ... ON CONFLICT (name, price) DO UPDATE``.
+
+    As chaves devem ser distintas dentro da chamada. Retorna, na mesma ordem
+    das linhas, pares (id, created) indicando se a peça foi criada ou
+    atualizada.
+
+    Com ``skip_unchanged``, peças que já existem com a mesma descrição e
+    quantidade não são regravadas (nem geram WAL ou mudam ``updated_at``) e
+    ficam fora do retorno.
+    """
+    if not rows:
+        return []
+
+    table = Part._meta.db_table
+    now = timezone.now()
+    params = []
+    for name, description, price, quantity in rows:
+        params += [name, description, price, quantity, now, now]
+
+    changed = (
+        f"WHERE ({table}.description, {table}.quantity) "
+        f"IS DISTINCT FROM (EXCLUDED.description, EXCLUDED.quantity) "
+        if skip_unchanged else ""
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (name, description, price, quantity, created_at, updated_at) "
+            f"VALUES {', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))} "
+            f"ON CONFLICT (name, price) DO UPDATE SET "
+            f"description = EXCLUDED.description, quantity = EXCLUDED.quantity, "
+            f"updated_at = EXCLUDED.updated_at "
+            f"{changed}"
+            # xmax = 0 só vale para linhas recém-inseridas
+            f"RETURNING id, (xmax = 0)",
+            params,
+        )
+        return cursor.fetchall()
+
+
+def upsert_chunk(rows):
+    """
+    Grava um lote de linhas já normalizadas em um único upsert nativo do
+    Postgres, seguro para vários workers em paralelo.
+
+    A identidade da peça é o par (name, price). Quando a mesma chave aparece
+    mais de uma vez, a última ocorrência prevalece e as anteriores contam como
+    atualização, reproduzindo o comportamento do ``update_or_create`` linha a
+    linha. Peças que já estão com a mesma descrição e quantidade não são
+    regravadas. Retorna a tupla (created, updated, unchanged).
+    """
+    pending = {}
+    for name, description, price, quantity in rows:
+        pending[(name, price)] = (description, quantity)
+
+    # Ordem estável das chaves para que importações concorrentes travem as
+    # mesmas linhas na mesma ordem, sem deadlock
+    result = upsert_parts([
+        (name, description, price, quantity)
+        for (name, price), (description, quantity) in sorted(pending.items())
+    ], skip_unchanged=True)
+    if result:
+        invalidate_parts_cache()
+
+    created = sum(1 for _, is_new in result if is_new)
+    unchanged = len(pending) - len(result)
+    return created, len(rows) - created - unchanged, unchanged
+
+
+def import_rows(rows, batch_size=None, on_progress=None, report=None):
+    """
+    Importa um iterável de pares (número da linha, dicionário no formato do
+    ``csv.DictReader``) em lotes de ``batch_size`` e retorna a contagem de
+    peças criadas, atualizadas, inalteradas e ignoradas. Cada lote é
+    validado de uma vez (``validate_chunk``) e os problemas vão para
+    ``report``, quando informado.
+
+    Quando informado, ``on_progress(created, updated, unchanged, skipped)`` é
+    chamado a cada ``PARTS_IMPORT_PROGRESS_EVERY`` linhas com o incremento
+    desde a chamada anterior.
+    """
+    batch_size = batch_size or settings.PARTS_IMPORT_BATCH_SIZE
+    progress_every = settings.PARTS_IMPORT_PROGRESS_EVERY
+
+    totals = {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+    reported = dict(totals)
+
+    def notify(force=False):
+        if on_progress is None:
+            return
+        delta = {key: totals[key] - reported[key] for key in totals}
+        if force or sum(delta.values()) >= progress_every:
+            on_progress(**delta)
+            reported.update(totals)
+
+    for valid, rejected in validate_rows(rows, batch_size, report):
+        totals["skipped"] += rejected
+        if valid:
+            chunk_created, chunk_updated, chunk_unchanged = upsert_chunk(valid)
+            totals["created"] += chunk_created
+            totals["updated"] += chunk_updated
+            totals["unchanged"] += chunk_unchanged
+        notify()
+    notify(force=True)
+
+    return {**totals, "total": sum(totals.values())}
@@ -0,0 +1,122 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+
+from .models import InventorySummary, Part
+
+SUMMARY_FIELDS = ('sku_count', 'total_quantity', 'stock_value', 'out_of_stock_count', 'low_stock_count')
+
+# Chave do advisory lock que serializa compactação e reconciliação
+SUMMARY_LOCK_ID = 0x1A7E57
+
+
+def get_inventory_stats():
+    """
+    Totais do estoque a partir do resumo mantido pelos triggers: soma das
+    variações gravadas desde a última compactação, qualquer que seja o
+    tamanho do catálogo.
+
+    A leitura só fica limitada enquanto a compactação periódica (Celery
+    Beat, ``compact_inventory_summary``) estiver rodando. Sem ela, quando as
+    variações passam de ``PARTS_INVENTORY_MAX_ROWS`` linhas a própria
+    leitura as compacta.
+    """
+    totals = InventorySummary.objects.aggregate(
+        **{field: Sum(field) for field in SUMMARY_FIELDS},
+        updated_at=Max('updated_at'),
+        rows=Count('id'),
+    )
+    if totals['rows'] > settings.PARTS_INVENTORY_MAX_ROWS:
+        compact_inventory(wait=False)
+    stats = {field: totals[field] or 0 for field in SUMMARY_FIELDS}
+    stats['stock_value'] = Decimal(stats['stock_value'])
+    stats['updated_at'] = totals['updated_at']
+    return stats
+
+
+def compact_inventory(wait=True):
+    """
+    Junta em uma única linha as variações gravadas pelos triggers, para que
+    a leitura some poucas linhas. Apaga só as linhas visíveis no início do
+    comando; variações gravadas por transações concorrentes ficam para a
+    próxima compactação.
+
+    Com ``wait=False``, não faz nada se outra compactação ou reconciliação
+    estiver em andamento.
+
+    Retorna quantas linhas foram juntadas.
+    """
+    table = InventorySummary._meta.db_table
+    columns = ', '.join(SUMMARY_FIELDS)
+    sums = ', '.join(f'sum({field})' for field in SUMMARY_FIELDS)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if wait:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [SUMMARY_LOCK_ID])
+        else:
+            cursor.execute('SELECT pg_try_advisory_xact_lock(%s)', [SUMMARY_LOCK_ID])
+            if not cursor.fetchone()[0]:
+                return 0
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {table} WHERE (SELECT count(*) FROM {table}) > 1 RETURNING *
+            ),
+            compacted AS (
+                INSERT INTO {table} ({columns}, updated_at)
+                SELECT {sums}, max(updated_at) FROM moved
+                HAVING count(*) > 0
+            )
+            SELECT count(*) FROM moved
+            """
+        )
+        return cursor.fetchone()[0]
+
+
+def reconcile_inventory():
+    """
+    Confere o resumo contra uma agregação completa de ``Part``, corrige a
+    diferença, que só aparece com escritas fora dos triggers (ex.: TRUNCATE
+    ou triggers desativados em uma restauração), e compacta o resumo.
+
+    A agregação e a remoção das variações acontecem no mesmo comando,
+    portanto no mesmo snapshot: a linha gravada com os totais reais substitui
+    exatamente as variações já contidas neles, e as gravadas por escritas
+    concorrentes continuam valendo. Não há lock sobre a tabela de peças.
+
+    Retorna a diferença encontrada em cada total (vazio se nenhuma).
+    """
+    part_table = Part._meta.db_table
+    summary_table = InventorySummary._meta.db_table
+    columns = ', '.join(SUMMARY_FIELDS)
+    summary_columns = ', '.join(f'coalesce(sum({field}), 0) AS {field}' for field in SUMMARY_FIELDS)
+    drift_columns = ', '.join(f'actual.{field} - summary.{field} AS {field}' for field in SUMMARY_FIELDS)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [SUMMARY_LOCK_ID])
+        cursor.execute(
+            f"""
+            WITH actual AS (
+                SELECT
+                    count(*) AS sku_count,
+                    coalesce(sum(quantity), 0) AS total_quantity,
+                    coalesce(sum(quantity * price), 0) AS stock_value,
+                    count(*) FILTER (WHERE quantity = 0) AS out_of_stock_count,
+                    count(*) FILTER (WHERE quantity > 0 AND quantity < minimum_quantity) AS low_stock_count
+                FROM {part_table}
+            ),
+            moved AS (
+                DELETE FROM {summary_table} RETURNING *
+            ),
+            summary AS (
+                SELECT {summary_columns} FROM moved
+            ),
+            replaced AS (
+                INSERT INTO {summary_table} ({columns}, updated_at)
+                SELECT {columns}, now() FROM actual
+            )
+            SELECT {drift_columns} FROM actual, summary
+            """
+        )
+        row = cursor.fetchone()
+    return {field: value for field, value in zip(SUMMARY_FIELDS, row) if value}
@@ -0,0 +1,503 @@
+import asyncio
+import csv
+import json
+import random
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.products.importers import upsert_parts
+from apps.products.models import Part
+from apps.products.pagination import PartKeysetPagination
+from apps.products.serializers import PartListSerializer, compile_row_converter
+from apps.products.stock import reserve_stock
+from apps.products.tasks import (import_parts_from_csv, replenish_low_stock,
+                                 replenish_stock_minimum)
+from apps.products.views import PartDetailView, PartListView
+from marketplace.renderers import FastJSONRenderer
+
+# Todas as peças sintéticas usam esse prefixo e são removidas ao final
+BENCH_PREFIX = 'bench:'
+WORDS = (
+    'freio', 'filtro', 'óleo', 'pastilha', 'amortecedor', 'vela', 'correia',
+    'radiador', 'embreagem', 'farol', 'bomba', 'sensor', 'junta', 'rolamento',
+)
+# Execuções isoladas de serviços externos: cache em memória e tarefas Celery
+# chamadas diretamente, sem broker (as escritas não agendam a reposição)
+BENCH_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    'PARTS_REPLENISH_ON_WRITE': False,
+}
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def synthetic_rows(rows, seed):
+    """
+    Gera ``rows`` peças sintéticas (name, description, price, quantity) de
+    forma determinística para a mesma semente.
+    """
+    rng = random.Random(seed)
+    for i in range(rows):
+        words = rng.sample(WORDS, 3)
+        yield (
+            f'{BENCH_PREFIX}{words[0].capitalize()} {i:07d}',
+            f'{" ".join(words)} para linha {i % 97}',
+            Decimal(rng.randint(100, 500000)) / 100,
+            rng.randint(0, 50),
+        )
+
+
+def write_csv(path, rows, seed, change_every=0):
+    """
+    Grava a planilha sintética. Com ``change_every``, a quantidade de uma a
+    cada ``change_every`` linhas muda, simulando o reenvio diário do fornecedor.
+    """
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(('nome', 'descricao', 'preco', 'quantidade'))
+        for i, (name, description, price, quantity) in enumerate(synthetic_rows(rows, seed)):
+            if change_every and i % change_every == 0:
+                quantity += 1
+            writer.writerow((name, description, price, quantity))
+
+
+async def read_response(reader):
+    """
+    Lê uma resposta HTTP/1.1 inteira e retorna (status, keep_alive).
+    """
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    status = int(head[0].split()[1])
+    headers = {}
+    for line in head[1:]:
+        if ':' in line:
+            key, value = line.split(':', 1)
+            headers[key.strip().lower()] = value.strip().lower()
+
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.read()
+        return status, False
+    return status, headers.get('connection') != 'close'
+
+
+async def http_load(url, token, concurrency, duration, think):
+    """
+    Mantém ``concurrency`` clientes fazendo GET em ``url`` durante
+    ``duration`` segundos, reaproveitando a conexão (keep-alive) sempre que o
+    servidor permitir e esperando ``think`` segundos entre as requisições.
+    """
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    request = (
+        f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\n'
+        f'Authorization: Bearer {token}\r\nAccept: application/json\r\n\r\n'
+    ).encode()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    timings = []
+    stats = {'errors': 0, 'connections': 0}
+
+    async def client():
+        writer = None
+        while loop.time() < deadline:
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(
+                        parts.hostname, port, ssl=parts.scheme == 'https' or None
+                    )
+                    stats['connections'] += 1
+                start = time.perf_counter()
+                writer.write(request)
+                status, keep_alive = await read_response(reader)
+                timings.append(time.perf_counter() - start)
+                if status != 200:
+                    stats['errors'] += 1
+                if not keep_alive:
+                    writer.close()
+                    writer = None
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+                stats['errors'] += 1
+                writer = None
+            if think:
+                await asyncio.sleep(think)
+        if writer is not None:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': len(timings),
+        'requests_per_second': round(len(timings) / elapsed, 1),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3) if timings else None,
+        'p99_ms': round(percentile(timings, 99) * 1000, 3) if timings else None,
+        **stats,
+    }
+
+
+class QueryCounter:
+    """
+    Conta as queries executadas via ``connection.execute_wrapper`` sem
+    guardar o SQL, para não pesar em cenários com milhões de linhas.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa benchmarks de desempenho do catálogo de peças e imprime o resultado em JSON. "
+        "Grava peças sintéticas (prefixo 'bench:') no banco configurado: use um Postgres local."
+    )
+
+    scenarios = ('serialization', 'import', 'list', 'detail', 'replenish', 'reservations', 'load')
+    # Cenários que dependem de um servidor no ar só rodam quando pedidos
+    server_scenarios = ('load',)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=self.scenarios,
+            help='Cenário a executar (pode ser repetido). Padrão: todos, exceto load.',
+        )
+        parser.add_argument('--rows', type=int, default=10000, help='Tamanho do catálogo sintético (ex.: 10000, 1000000).')
+        parser.add_argument('--requests', type=int, default=200, help='Requisições por medição de latência.')
+        parser.add_argument('--repeat', type=int, default=5, help='Repetições por medição (vale a melhor).')
+        parser.add_argument('--threads', type=int, default=8, help='Threads concorrentes nos cenários de contenção.')
+        parser.add_argument('--url', action='append', help='URL alvo do cenário load (pode ser repetida).')
+        parser.add_argument('--concurrency', type=int, default=200, help='Clientes simultâneos do cenário load.')
+        parser.add_argument('--duration', type=float, default=10, help='Duração (s) do cenário load por URL.')
+        parser.add_argument('--think', type=float, default=0, help='Pausa (s) de cada cliente entre requisições no cenário load.')
+        parser.add_argument('--seed', type=int, default=42, help='Semente dos dados sintéticos.')
+        parser.add_argument('--write-csv', metavar='PATH', help='Apenas gera a planilha sintética com --rows linhas.')
+        parser.add_argument('--keep', action='store_true', help='Não remove as peças sintéticas ao final.')
+        parser.add_argument('--output', help='Arquivo onde gravar o JSON com os resultados.')
+
+    def handle(self, *args, **options):
+        if options['write_csv']:
+            write_csv(options['write_csv'], options['rows'], options['seed'])
+            return
+
+        self.rng = random.Random(options['seed'])
+        self.user = User(username='bench')
+        self.factory = APIRequestFactory()
+        results = {
+            'meta': {
+                'rows': options['rows'],
+                'requests': options['requests'],
+                'seed': options['seed'],
+                'database': connection.vendor,
+            },
+        }
+        # A limpeza também invalida o cache pelos signals: fica dentro do
+        # override, para não depender do Redis
+        with override_settings(**BENCH_SETTINGS):
+            try:
+                default = [name for name in self.scenarios if name not in self.server_scenarios]
+                for scenario in options['scenario'] or default:
+                    results[scenario] = getattr(self, f'bench_{scenario}')(options)
+            finally:
+                if not options['keep']:
+                    Part.objects.filter(name__startswith=BENCH_PREFIX).delete()
+
+        report = json.dumps(results, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report + '\n')
+        self.stdout.write(report)
+
+    def seed_catalog(self, options):
+        """
+        Grava (ou restaura) o catálogo sintético e retorna os ids das peças.
+        """
+        batch = []
+        for row in synthetic_rows(options['rows'], options['seed']):
+            batch.append(row)
+            if len(batch) == 1000:
+                upsert_parts(batch)
+                batch = []
+        upsert_parts(batch)
+        return list(
+            Part.objects.filter(name__startswith=BENCH_PREFIX).order_by('id').values_list('id', flat=True)
+        )
+
+    def measure(self, view, requests, make_request, warm=False):
+        """
+        Latência (p50/p99, em ms) e queries por requisição de uma view. Sem
+        ``warm``, o cache é limpo antes de cada requisição.
+        """
+        timings = []
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            for _ in range(requests):
+                if not warm:
+                    cache.clear()
+                request, kwargs = make_request()
+                force_authenticate(request, user=self.user)
+                start = time.perf_counter()
+                response = view(request, **kwargs)
+                response.render()
+                timings.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    raise CommandError(f'{request.get_full_path()} respondeu {response.status_code}')
+        return {
+            'p50_ms': round(percentile(timings, 50) * 1000, 3),
+            'p99_ms': round(percentile(timings, 99) * 1000, 3),
+            'queries_per_request': round(counter.count / requests, 2),
+        }
+
+    def bench_serialization(self, options):
+        """
+        Custo por linha da listagem: instâncias + PartListSerializer +
+        JSONRenderer contra ``.values()`` + conversor pré-compilado +
+        FastJSONRenderer. Usa linhas sintéticas, sem acessar o banco.
+        """
+        rows = options['rows']
+        # Mesma ordem das colunas no modelo, como o ORM entrega as linhas
+        fields = ('id', 'name', 'description', 'price', 'quantity')
+        values = [
+            (i, f'Peça {i}', f'Descrição da peça {i}', Decimal(i % 100000) / 100, i % 50)
+            for i in range(rows)
+        ]
+
+        def serializer_path():
+            parts = [Part.from_db('default', fields, row) for row in values]
+            JSONRenderer().render(PartListSerializer(parts, many=True).data)
+
+        convert = compile_row_converter(PartListSerializer)
+
+        def fast_path():
+            dicts = [dict(zip(fields, row)) for row in values]
+            FastJSONRenderer().render([convert(row) for row in dicts])
+
+        before = best_of(options['repeat'], serializer_path)
+        after = best_of(options['repeat'], fast_path)
+        return {
+            'rows': rows,
+            'serializer_us_per_row': round(before / rows * 1e6, 3),
+            'fast_path_us_per_row': round(after / rows * 1e6, 3),
+            'speedup': round(before / after, 2),
+        }
+
+    def bench_import(self, options):
+        """
+        Linhas/s de ``import_parts_from_csv`` lendo a planilha do storage:
+        primeira carga (só criações), reimportação da mesma planilha (nenhuma
+        mudança) e reenvio diário com 1% das quantidades alteradas.
+        """
+        Part.objects.filter(name__startswith=BENCH_PREFIX).delete()
+        rows = options['rows']
+        results = {'rows': rows}
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            sources = {'first_load': 0, 'reimport': 0, 'daily': 100}
+            for phase, change_every in sources.items():
+                staged = f'{phase}.csv'
+                write_csv(default_storage.path(staged), rows, options['seed'], change_every)
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    start = time.perf_counter()
+                    result = import_parts_from_csv(file_path=staged)
+                    elapsed = time.perf_counter() - start
+                results[phase] = {
+                    'seconds': round(elapsed, 3),
+                    'rows_per_second': round(rows / elapsed, 1),
+                    'queries': counter.count,
+                    'created': result['created'],
+                    'updated': result['updated'],
+                    'unchanged': result['unchanged'],
+                }
+        return results
+
+    def bench_list(self, options):
+        """
+        Latência da listagem: primeira página (com e sem cache), última página
+        por número, páginas aleatórias por cursor e busca textual.
+        """
+        ids = self.seed_catalog(options)
+        view = PartListView.as_view()
+        path = reverse('part-list')
+        page_size = PartKeysetPagination.page_size
+        last_page = max(1, -(-Part.objects.count() // page_size))
+        sample = self.rng.sample(ids, min(len(ids), options['requests']))
+        positions = list(Part.objects.filter(id__in=sample).values_list('name', 'id'))
+        encode_cursor = PartKeysetPagination().encode_cursor
+
+        def get(params):
+            return lambda: (self.factory.get(path, params() if callable(params) else params), {})
+
+        requests = options['requests']
+        return {
+            'first_page': self.measure(view, requests, get({'page': 1})),
+            'first_page_cached': self.measure(view, requests, get({'page': 1}), warm=True),
+            'last_page': self.measure(view, requests, get({'page': last_page})),
+            'cursor': self.measure(
+                view, requests, get(lambda: {'cursor': encode_cursor(self.rng.choice(positions))})
+            ),
+            'search': self.measure(view, requests, get(lambda: {'q': self.rng.choice(WORDS)})),
+        }
+
+    def bench_detail(self, options):
+        """
+        Latência do detalhe: peças aleatórias sem cache e a mesma peça
+        repetidamente com cache.
+        """
+        ids = self.seed_catalog(options)
+        view = PartDetailView.as_view()
+
+        def get(choose):
+            def make_request():
+                pk = choose()
+                return self.factory.get(reverse('part-detail', args=[pk])), {'pk': pk}
+            return make_request
+
+        return {
+            'cold': self.measure(view, options['requests'], get(lambda: self.rng.choice(ids))),
+            'cached': self.measure(view, options['requests'], get(lambda: ids[0]), warm=True),
+        }
+
+    def bench_replenish(self, options):
+        """
+        Reposição sobre o catálogo sintético: a varredura global de
+        ``replenish_stock_minimum`` com cerca de 20% das peças abaixo do
+        mínimo, ``replenish_low_stock`` depois que 1% do catálogo zera e
+        ``replenish_low_stock`` sem nada a repor (varredura periódica ociosa).
+
+        As tasks atualizam qualquer peça do banco abaixo do mínimo, não só as
+        sintéticas, então o cenário roda em uma transação desfeita ao final.
+        """
+        ids = self.seed_catalog(options)
+        with transaction.atomic():
+            full_scan = self.time_replenish(replenish_stock_minimum)
+            low = self.rng.sample(ids, max(len(ids) // 100, 1))
+            Part.objects.filter(id__in=low).update(quantity=0)
+            results = {
+                'full_scan': full_scan,
+                'low_stock': self.time_replenish(replenish_low_stock),
+                'idle': self.time_replenish(replenish_low_stock),
+            }
+            transaction.set_rollback(True)
+        return results
+
+    def time_replenish(self, task):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            result = task()
+            elapsed = time.perf_counter() - start
+        return {
+            'seconds': round(elapsed, 3),
+            'updated_count': result['updated_count'],
+            'queries': counter.count,
+        }
+
+    def bench_reservations(self, options):
+        """
+        Vazão de reservas concorrentes sobre uma única peça "quente". Cada
+        thread usa a própria conexão e faz ``--requests`` reservas de uma
+        unidade; ao final confere que nenhuma baixa foi perdida.
+        """
+        threads = options['threads']
+        per_thread = options['requests']
+        initial = threads * per_thread // 2
+        part = Part.objects.create(name=f'{BENCH_PREFIX}reservations', price=1, quantity=initial)
+        counters = {'reserved': 0, 'conflicts': 0}
+        lock = threading.Lock()
+
+        def worker():
+            reserved = conflicts = 0
+            try:
+                for _ in range(per_thread):
+                    try:
+                        reserve_stock(part.id, 1)
+                        reserved += 1
+                    except APIException:
+                        conflicts += 1
+            finally:
+                connection.close()
+            with lock:
+                counters['reserved'] += reserved
+                counters['conflicts'] += conflicts
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        part.refresh_from_db()
+        part.delete()
+        return {
+            'threads': threads,
+            'attempts': threads * per_thread,
+            'reserved': counters['reserved'],
+            'conflicts': counters['conflicts'],
+            'reservations_per_second': round(threads * per_thread / elapsed, 1),
+            'lost_updates': initial - counters['reserved'] - part.quantity,
+        }
+
+    def bench_load(self, options):
+        """
+        Carga HTTP contra um servidor no ar (``--url``), para comparar o
+        deploy síncrono (gunicorn) com o assíncrono (uvicorn): muitos clientes
+        simultâneos com keep-alive, opcionalmente lentos (``--think``).
+        """
+        if not options['url']:
+            raise CommandError('Informe ao menos uma --url para o cenário load.')
+
+        self.seed_catalog(options)
+        user, created = User.objects.get_or_create(username=f'{BENCH_PREFIX}load')
+        token = str(AccessToken.for_user(user))
+        try:
+            return {
+                url: asyncio.run(http_load(
+                    url, token, options['concurrency'], options['duration'], options['think']
+                ))
+                for url in options['url']
+            }
+        finally:
+            if created:
+                user.delete()
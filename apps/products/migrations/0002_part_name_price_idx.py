@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:29
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Índice criado com CONCURRENTLY para não bloquear escritas no catálogo
+    atomic = False
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='part',
+            index=models.Index(fields=['name', 'price'], name='part_name_price_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:33
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Índice criado com CONCURRENTLY para não bloquear escritas no catálogo
+    atomic = False
+
+    dependencies = [
+        ('products', '0003_importjob'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='part',
+            index=models.Index(fields=['quantity'], name='part_quantity_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:36
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import (AddIndexConcurrently,
+                                                TrigramExtension)
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Índices criados com CONCURRENTLY para não bloquear escritas no catálogo
+    atomic = False
+
+    dependencies = [
+        ('products', '0005_part_name_id_idx'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='part',
+            index=models.Index(fields=['price'], name='part_price_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='part',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.search.SearchVector('name', 'description', config='portuguese'), name='part_search_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='part',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass('name', name='gin_trgm_ops'), name='part_name_trgm_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:50
+
+from django.db import migrations, models
+
+# Para cada chave (name, price) repetida, mantém a peça de menor id com os
+# valores da ocorrência alterada por último e remove as demais
+MERGE_DUPLICATES_SQL = """
+UPDATE products_part AS keep
+SET description = latest.description,
+    quantity = latest.quantity,
+    updated_at = latest.updated_at
+FROM (
+    SELECT name, price, MIN(id) AS id
+    FROM products_part
+    GROUP BY name, price
+    HAVING COUNT(*) > 1
+) AS dup,
+(
+    SELECT DISTINCT ON (name, price) name, price, description, quantity, updated_at
+    FROM products_part
+    ORDER BY name, price, updated_at DESC, id DESC
+) AS latest
+WHERE keep.id = dup.id
+  AND latest.name = dup.name
+  AND latest.price = dup.price;
+
+DELETE FROM products_part AS dup
+USING products_part AS keep
+WHERE dup.name = keep.name
+  AND dup.price = keep.price
+  AND dup.id > keep.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_part_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(MERGE_DUPLICATES_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='part',
+            constraint=models.UniqueConstraint(fields=('name', 'price'), name='part_name_price_uniq'),
+        ),
+        migrations.RemoveIndex(
+            model_name='part',
+            name='part_name_price_idx',
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_part_name_price_uniq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='unchanged_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_importjob_checksum_unchanged'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='error_report',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def log_rows(rows, deleted):
+    return f"""
+        INSERT INTO products_partchange (txid, part_id, deleted, recorded_at)
+        SELECT pg_current_xact_id()::text::bigint, id, {deleted}, now() FROM {rows};
+    """
+
+
+# Cada ramo só referencia a tabela de transição que o evento possui
+LOG_FUNCTION = f"""
+CREATE FUNCTION products_part_log_changes() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        {log_rows("old_rows", "true")}
+    ELSE
+        {log_rows("new_rows", "false")}
+    END IF;
+    RETURN NULL;
+END
+$$;
+"""
+
+# Um trigger por comando e por evento, lendo as tabelas de transição: uma
+# remoção em lote de dez mil peças grava o registro com um único INSERT
+CREATE_TRIGGERS = """
+CREATE TRIGGER products_part_changes_insert AFTER INSERT ON products_part
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION products_part_log_changes();
+CREATE TRIGGER products_part_changes_update AFTER UPDATE ON products_part
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION products_part_log_changes();
+CREATE TRIGGER products_part_changes_delete AFTER DELETE ON products_part
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION products_part_log_changes();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS products_part_changes_insert ON products_part;
+DROP TRIGGER IF EXISTS products_part_changes_update ON products_part;
+DROP TRIGGER IF EXISTS products_part_changes_delete ON products_part;
+DROP FUNCTION IF EXISTS products_part_log_changes();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_importjob_error_report'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('txid', models.BigIntegerField()),
+                ('part_id', models.BigIntegerField(null=True)),
+                ('deleted', models.BooleanField(default=False)),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['txid', 'id'], name='part_change_position_idx'),
+                    models.Index(fields=['recorded_at'], name='part_change_recorded_at_idx'),
+                    models.Index(condition=models.Q(('part_id__isnull', True)), fields=['txid', 'id'], name='part_change_horizon_idx'),
+                ],
+            },
+        ),
+        migrations.RunSQL(LOG_FUNCTION + CREATE_TRIGGERS, DROP_TRIGGERS),
+    ]
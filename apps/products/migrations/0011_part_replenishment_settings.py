@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:44
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Índice criado com CONCURRENTLY para não bloquear escritas no catálogo
+    atomic = False
+
+    dependencies = [
+        ('products', '0010_part_changes_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='part',
+            name='minimum_quantity',
+            field=models.PositiveIntegerField(db_default=10, default=10),
+        ),
+        migrations.AddField(
+            model_name='part',
+            name='reorder_quantity',
+            field=models.PositiveIntegerField(db_default=0, default=0),
+        ),
+        AddIndexConcurrently(
+            model_name='part',
+            index=models.Index(condition=models.Q(('quantity__lt', models.F('minimum_quantity'))), fields=['id'], name='part_low_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+LOW_STOCK = "quantity > 0 AND quantity < minimum_quantity"
+
+SUMMARY_COLUMNS = "sku_count, total_quantity, stock_value, out_of_stock_count, low_stock_count, updated_at"
+
+NEW_ROWS = "SELECT 1 AS sign, quantity, price, minimum_quantity FROM new_rows"
+OLD_ROWS = "SELECT -1 AS sign, quantity, price, minimum_quantity FROM old_rows"
+
+
+def apply_changes(changes):
+    # Grava em uma linha nova a variação do comando: linhas incluídas (+1)
+    # e removidas (-1)
+    return f"""
+        WITH changes AS ({changes})
+        INSERT INTO products_inventorysummary ({SUMMARY_COLUMNS})
+        SELECT
+            sum(sign),
+            sum(sign * quantity),
+            sum(sign * quantity * price),
+            coalesce(sum(sign) FILTER (WHERE quantity = 0), 0),
+            coalesce(sum(sign) FILTER (WHERE {LOW_STOCK}), 0),
+            now()
+        FROM changes
+        HAVING count(*) > 0;
+    """
+
+
+# Cada ramo só referencia as tabelas de transição que o evento possui
+APPLY_FUNCTION = f"""
+CREATE FUNCTION products_inventory_apply() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        {apply_changes(NEW_ROWS)}
+    ELSIF TG_OP = 'DELETE' THEN
+        {apply_changes(OLD_ROWS)}
+    ELSE
+        {apply_changes(NEW_ROWS + " UNION ALL " + OLD_ROWS)}
+    END IF;
+    RETURN NULL;
+END
+$$;
+"""
+
+# Triggers por comando (não por linha), com as linhas afetadas nas tabelas
+# de transição: um INSERT ... ON CONFLICT de mil peças grava uma única
+# linha no resumo. O Postgres não aceita tabelas de transição em triggers
+# de mais de um evento, daí um trigger por evento.
+CREATE_TRIGGERS = """
+CREATE TRIGGER products_inventory_insert AFTER INSERT ON products_part
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION products_inventory_apply();
+CREATE TRIGGER products_inventory_update AFTER UPDATE ON products_part
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION products_inventory_apply();
+CREATE TRIGGER products_inventory_delete AFTER DELETE ON products_part
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION products_inventory_apply();
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS products_inventory_insert ON products_part;
+DROP TRIGGER IF EXISTS products_inventory_update ON products_part;
+DROP TRIGGER IF EXISTS products_inventory_delete ON products_part;
+DROP FUNCTION IF EXISTS products_inventory_apply();
+"""
+
+# Carga inicial; o lock do CREATE TRIGGER impede escritas até o commit
+BACKFILL = f"""
+INSERT INTO products_inventorysummary ({SUMMARY_COLUMNS})
+SELECT
+    count(*),
+    coalesce(sum(quantity), 0),
+    coalesce(sum(quantity * price), 0),
+    count(*) FILTER (WHERE quantity = 0),
+    count(*) FILTER (WHERE {LOW_STOCK}),
+    now()
+FROM products_part;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_part_replenishment_settings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventorySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sku_count', models.BigIntegerField(default=0)),
+                ('total_quantity', models.BigIntegerField(default=0)),
+                ('stock_value', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('out_of_stock_count', models.BigIntegerField(default=0)),
+                ('low_stock_count', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunSQL(APPLY_FUNCTION + CREATE_TRIGGERS + BACKFILL, DROP_TRIGGERS),
+    ]
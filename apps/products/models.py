@@ -1,4 +1,14 @@
+import os
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector
 from django.db import models
+from django.db.models import F, Q
+from django.utils import timezone
+
+# Mesma expressão do índice GIN, para que a busca textual use o índice
+PART_SEARCH_VECTOR = SearchVector('name', 'description', config='portuguese')
 
 
 class Part(models.Model):
@@ -6,11 +16,189 @@ class Part(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=0)
+    # Reposição: abaixo de ``minimum_quantity`` a peça volta para
+    # max(minimum_quantity, quantity + reorder_quantity). O ``db_default``
+    # vale para os INSERTs em SQL da importação
+    minimum_quantity = models.PositiveIntegerField(default=10, db_default=10)
+    reorder_quantity = models.PositiveIntegerField(default=0, db_default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['name']
+        constraints = [
+            # Chave natural usada pela importação; o índice único também
+            # atende as buscas por (name, price)
+            models.UniqueConstraint(fields=['name', 'price'], name='part_name_price_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['quantity'], name='part_quantity_idx'),
+            models.Index(fields=['name', 'id'], name='part_name_id_idx'),
+            models.Index(fields=['price'], name='part_price_idx'),
+            # Só as peças abaixo do mínimo, percorridas pela reposição
+            models.Index(
+                fields=['id'],
+                condition=Q(quantity__lt=F('minimum_quantity')),
+                name='part_low_stock_idx',
+            ),
+            GinIndex(PART_SEARCH_VECTOR, name='part_search_idx'),
+            GinIndex(OpClass('name', name='gin_trgm_ops'), name='part_name_trgm_idx'),
+        ]
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class PartChange(models.Model):
+    """
+    Registro de cada peça criada, alterada ou removida, gravado por triggers
+    no Postgres (migração 0010) e lido pelo feed de alterações
+    (``parts/changes/``).
+
+    A posição no feed é (``txid``, ``id``), com ``txid`` o id da transação
+    que fez a alteração. O feed só entrega transações anteriores ao xmin do
+    snapshot corrente, todas já confirmadas ou desfeitas, então uma
+    transação longa segura o feed até o commit em vez de ficar para trás do
+    cursor.
+
+    Mantido por ``PARTS_CHANGES_RETENTION_DAYS`` dias. A alteração mais
+    recente entre as apagadas fica como marco (``part_id`` nulo): cursores
+    anteriores a ela perderam alterações e recebem 410.
+    """
+    txid = models.BigIntegerField()
+    part_id = models.BigIntegerField(null=True)
+    deleted = models.BooleanField(default=False)
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'id'], name='part_change_position_idx'),
+            models.Index(fields=['recorded_at'], name='part_change_recorded_at_idx'),
+            # O marco é uma única linha; sem o índice parcial, achá-lo
+            # percorreria o registro inteiro
+            models.Index(
+                fields=['txid', 'id'], condition=models.Q(part_id__isnull=True),
+                name='part_change_horizon_idx',
+            ),
+        ]
+
+    def __str__(self):
+        action = 'removida' if self.deleted else 'alterada'
+        return f'{self.part_id} ({action} em {self.recorded_at:%Y-%m-%d %H:%M})'
+
+
+class InventorySummary(models.Model):
+    """
+    Totais do estoque mantidos por triggers no Postgres a cada INSERT,
+    UPDATE e DELETE em ``Part`` (migração 0012), inclusive os feitos
+    em SQL pela importação, pela reposição e pelas reservas.
+
+    Cada comando que altera peças acrescenta uma linha com a própria
+    variação, sem atualizar linhas existentes: escritas concorrentes não
+    disputam lock no resumo, nem mesmo em transações longas. A leitura soma
+    as linhas e ``compact_inventory`` periodicamente as junta em uma só.
+    """
+    sku_count = models.BigIntegerField(default=0)
+    total_quantity = models.BigIntegerField(default=0)
+    stock_value = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    out_of_stock_count = models.BigIntegerField(default=0)
+    low_stock_count = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'Resumo do estoque (#{self.pk})'
+
+
+class ImportJob(models.Model):
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pendente'
+        RUNNING = 'running', 'Em andamento'
+        FINISHED = 'finished', 'Concluída'
+        FAILED = 'failed', 'Falhou'
+
+    file_name = models.CharField(max_length=255)
+    # SHA-256 do arquivo enviado, usado para não reimportar a mesma planilha
+    checksum = models.CharField(max_length=64, blank=True, db_index=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    shards = models.PositiveIntegerField(default=1)
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    rows_processed = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    unchanged_count = models.PositiveIntegerField(default=0)
+    skipped_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    # Nome no storage do CSV (linha, coluna, motivo) com os problemas encontrados
+    error_report = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    progress_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.file_name} ({self.get_status_display()})'
+
+    @property
+    def rows_per_second(self):
+        if not self.started_at or not self.progress_at:
+            return None
+        elapsed = (self.progress_at - self.started_at).total_seconds()
+        if elapsed <= 0:
+            return None
+        return round(self.rows_processed / elapsed, 1)
+
+    @property
+    def eta_seconds(self):
+        if self.status == self.Status.FINISHED:
+            return 0
+        rate = self.rows_per_second
+        if not rate or self.total_rows is None:
+            return None
+        return max(round((self.total_rows - self.rows_processed) / rate), 0)
+
+    def _update(self, **fields):
+        ImportJob.objects.filter(pk=self.pk).update(**fields)
+
+    def mark_running(self, total_rows=None):
+        now = timezone.now()
+        self._update(status=self.Status.RUNNING, total_rows=total_rows, started_at=now, progress_at=now)
+
+    def set_total_rows(self, total_rows):
+        self._update(total_rows=total_rows)
+
+    def error_report_name(self):
+        return os.path.join(settings.PARTS_IMPORT_REPORT_DIR, f'importacao-{self.pk}-erros.csv')
+
+    def set_error_report(self, name):
+        if name:
+            self._update(error_report=name)
+
+    def add_progress(self, created=0, updated=0, unchanged=0, skipped=0):
+        # Incrementos via F() para que shards em paralelo não se sobrescrevam
+        self._update(
+            rows_processed=F('rows_processed') + created + updated + unchanged + skipped,
+            created_count=F('created_count') + created,
+            updated_count=F('updated_count') + updated,
+            unchanged_count=F('unchanged_count') + unchanged,
+            skipped_count=F('skipped_count') + skipped,
+            progress_at=timezone.now(),
+        )
+
+    def mark_finished(self, result):
+        now = timezone.now()
+        self._update(
+            status=self.Status.FINISHED,
+            rows_processed=result['total'],
+            created_count=result['created'],
+            updated_count=result['updated'],
+            unchanged_count=result['unchanged'],
+            skipped_count=result['skipped'],
+            progress_at=now,
+            finished_at=now,
+        )
+
+    def mark_failed(self, exc):
+        self._update(status=self.Status.FAILED, error=str(exc), finished_at=timezone.now())
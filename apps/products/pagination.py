@@ -0,0 +1,133 @@
+import json
+from base64 import b64decode, b64encode
+
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class PartKeysetPagination(BasePagination):
+    """
+    Paginação por cursor sobre a chave (name, id).
+
+    Cada página parte da última chave da página anterior em vez de usar
+    OFFSET, e não executa COUNT(*), então o custo de buscar a próxima página
+    é o mesmo em qualquer profundidade do catálogo.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor inválido.'
+    page_size = api_settings.PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.get_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        return self.get_page([item async for item in self.get_page_queryset(queryset, request)])
+
+    def get_page_queryset(self, queryset, request):
+        self.request = request
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by('name', 'id')
+        if position is not None:
+            name, pk = position
+            queryset = queryset.filter(name__gte=name).exclude(name=name, id__lte=pk)
+        return queryset[:self.page_size + 1]
+
+    def get_page(self, results):
+        self.has_next = len(results) > self.page_size
+        results = results[:self.page_size]
+        self.next_position = self.get_position(results[-1]) if self.has_next else None
+        return results
+
+    def get_position(self, item):
+        # Aceita tanto instâncias quanto dicionários vindos de ``.values()``
+        if isinstance(item, dict):
+            return item['name'], item['id']
+        return item.name, item.pk
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            name, pk = json.loads(b64decode(encoded.encode('ascii'), altchars=b'-_', validate=True))
+            return str(name), int(pk)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        data = json.dumps(list(position), separators=(',', ':')).encode('utf-8')
+        return b64encode(data, altchars=b'-_').decode('ascii')
+
+
+class PartPagination(PageNumberPagination):
+    """
+    Paginação por número de página (padrão). Informando ``cursor`` na query
+    string (vazio na primeira página), a listagem passa a usar
+    ``PartKeysetPagination``, exceto quando a view já ordenou o queryset
+    (ex.: por relevância na busca), ordem que a chave (name, id) perderia.
+    """
+    keyset_class = PartKeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(queryset, request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(queryset, request):
+            self.keyset = self.keyset_class()
+            return await self.keyset.apaginate_queryset(queryset, request, view)
+        # O Paginator do Django ainda não tem API assíncrona
+        return await sync_to_async(super().paginate_queryset)(queryset, request, view)
+
+    def use_keyset(self, queryset, request):
+        return self.keyset_class.cursor_query_param in request.query_params and not queryset.query.order_by
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.keyset_class.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': (
+                    'Cursor de paginação por chave (name, id). Envie vazio para iniciar. '
+                    'Ignorado na busca (q), que segue paginada por relevância.'
+                ),
+                'schema': {'type': 'string'},
+            },
+        ]
@@ -1,6 +1,10 @@
+from django.conf import settings
+from django.urls import reverse
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
-from .models import Part
+from .importers import IMPORT_FORMATS, import_format
+from .models import ImportJob, Part
 
 
 class PartListSerializer(serializers.ModelSerializer):
@@ -8,20 +12,201 @@ class PartListSerializer(serializers.ModelSerializer):
         model = Part
         fields = ('id', 'name', 'price', 'quantity', 'description')
 
+
+def compile_row_converter(serializer_class):
+    """
+    Gera uma função que converte um dicionário vindo de ``.values()`` na mesma
+    representação produzida por ``serializer_class``, sem instanciar o
+    serializer nem os campos a cada linha.
+
+    Campos cujo valor do banco já é a representação final (inteiros e
+    textos) são copiados diretamente; decimais são formatados com as casas
+    definidas no campo; os demais usam o ``to_representation`` do campo.
+    """
+    fields = serializer_class().fields
+    namespace = {}
+    items = []
+    for name, field in fields.items():
+        value = f"row[{name!r}]"
+        is_plain_decimal = (
+            isinstance(field, serializers.DecimalField)
+            and getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+            and field.decimal_places is not None
+            and not field.localize
+            and not field.normalize_output
+        )
+        if is_plain_decimal:
+            template = f"'{{:.{field.decimal_places}f}}'.format"
+            items.append(f"{name!r}: '' if {value} is None else {template}({value})")
+        elif isinstance(field, (serializers.IntegerField, serializers.CharField)):
+            items.append(f"{name!r}: {value}")
+        else:
+            namespace[f"field_{name}"] = field
+            items.append(f"{name!r}: None if {value} is None else field_{name}.to_representation({value})")
+
+    source = "def convert(row):\n    return {" + ", ".join(items) + "}\n"
+    exec(source, namespace)
+    return namespace["convert"]
+
+
+class PartFilterSerializer(serializers.Serializer):
+    q = serializers.CharField(
+        required=False,
+        max_length=255,
+        help_text="Busca textual em nome e descrição, aceitando nomes parciais.",
+    )
+    price_min = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    price_max = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    in_stock = serializers.BooleanField(
+        required=False,
+        allow_null=True,
+        help_text="true para peças com estoque, false para peças zeradas.",
+    )
+
+    def validate(self, attrs):
+        price_min = attrs.get("price_min")
+        price_max = attrs.get("price_max")
+        if price_min is not None and price_max is not None and price_min > price_max:
+            raise serializers.ValidationError("price_min deve ser menor ou igual a price_max.")
+        return attrs
+
 class PartDetailSerializer(PartListSerializer):
     class Meta(PartListSerializer.Meta):
         fields = '__all__'
         read_only_fields = ['created_at', 'updated_at']
 
 
+class PartBulkItemSerializer(PartDetailSerializer):
+    """
+    Valida os dados de uma peça dentro de uma operação em lote. Validadores
+    que consultam o banco ficam de fora para não gerar uma query por item.
+    """
+    class Meta(PartDetailSerializer.Meta):
+        validators = []
+
+
+class PartBulkOperationSerializer(serializers.Serializer):
+    OPERATIONS = ("create", "update", "delete")
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    id = serializers.IntegerField(required=False, min_value=1)
+    data = serializers.DictField(required=False)
+
+    def validate(self, attrs):
+        if attrs["op"] in ("update", "delete") and "id" not in attrs:
+            raise serializers.ValidationError({"id": "Obrigatório para update e delete."})
+        if attrs["op"] in ("create", "update") and "data" not in attrs:
+            raise serializers.ValidationError({"data": "Obrigatório para create e update."})
+        return attrs
+
+
+class PartBulkSerializer(serializers.Serializer):
+    operations = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=10000,
+        help_text="Lista de operações: {op: create|update|delete, id, data}.",
+    )
+
+
+
+class PartReserveSerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=1, max_value=2147483647)
+
+
+class PartReserveItemSerializer(PartReserveSerializer):
+    id = serializers.IntegerField(min_value=1)
+
+
+class PartReserveBatchSerializer(serializers.Serializer):
+    items = serializers.ListField(
+        child=PartReserveItemSerializer(),
+        allow_empty=False,
+        max_length=1000,
+    )
+
+
+class PartExportSerializer(serializers.Serializer):
+    output = serializers.ChoiceField(
+        choices=("csv", "ndjson"),
+        default="csv",
+        help_text="Formato do arquivo exportado.",
+    )
+
+
+class PartChangesSerializer(serializers.Serializer):
+    since = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Cursor devolvido pela chamada anterior. Sem ele, o feed parte do início do catálogo.",
+    )
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=settings.PARTS_CHANGES_MAX_PAGE_SIZE,
+        help_text="Quantidade máxima de itens (alterações e remoções) na resposta.",
+    )
+
+
+class InventoryStatsSerializer(serializers.Serializer):
+    sku_count = serializers.IntegerField(help_text="Peças cadastradas.")
+    total_quantity = serializers.IntegerField(help_text="Unidades em estoque somando todas as peças.")
+    stock_value = serializers.DecimalField(
+        max_digits=20, decimal_places=2, help_text="Soma de preço x quantidade."
+    )
+    out_of_stock_count = serializers.IntegerField(help_text="Peças com estoque zerado.")
+    low_stock_count = serializers.IntegerField(help_text="Peças com estoque abaixo do próprio minimum_quantity, sem estarem zeradas.")
+    updated_at = serializers.DateTimeField(allow_null=True, help_text="Última atualização do resumo.")
+
 
 class PartImportSerializer(serializers.Serializer):
 
     file = serializers.FileField(
-        help_text="Arquivo CSV contendo os dados das peças a serem importadas."
+        help_text=(
+            "Arquivo com as peças a serem importadas: CSV ou NDJSON (um objeto por "
+            "linha), opcionalmente compactado com gzip (.csv.gz, .ndjson.gz)."
+        )
+    )
+    shards = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=64,
+        help_text="Quantidade de partes processadas em paralelo pelos workers (padrão: 1).",
+    )
+    force = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text="Importa mesmo que um arquivo idêntico já tenha sido importado.",
     )
 
     def validate_file(self, value):
-        if not value.name.endswith(".csv"):
-            raise serializers.ValidationError("O arquivo deve ter extensão .csv")
+        if import_format(value.name) is None:
+            raise serializers.ValidationError(
+                f"O arquivo deve ter uma das extensões: {', '.join(IMPORT_FORMATS)}"
+            )
         return value
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    rows_per_second = serializers.FloatField(read_only=True, allow_null=True)
+    eta_seconds = serializers.IntegerField(read_only=True, allow_null=True)
+    error_report_url = serializers.SerializerMethodField(
+        help_text="Download do CSV (linha, coluna, motivo) com os problemas encontrados, se houver.",
+    )
+
+    class Meta:
+        model = ImportJob
+        fields = (
+            'id', 'file_name', 'status', 'shards', 'total_rows', 'rows_processed',
+            'rows_per_second', 'eta_seconds', 'created_count', 'updated_count',
+            'unchanged_count', 'skipped_count', 'error', 'error_report_url', 'created_at',
+            'started_at', 'finished_at',
+        )
+        read_only_fields = fields
+
+    def get_error_report_url(self, job) -> str | None:
+        if not job.error_report:
+            return None
+        url = reverse('part-import-errors', args=[job.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_parts_cache
+from .models import Part
+from .tasks import request_replenishment
+
+
+@receiver(post_save, sender=Part)
+@receiver(post_delete, sender=Part)
+def invalidate_cache_on_part_change(sender, **kwargs):
+    invalidate_parts_cache()
+
+
+@receiver(post_save, sender=Part)
+def replenish_on_low_stock(sender, instance, **kwargs):
+    if instance.quantity < instance.minimum_quantity:
+        request_replenishment()
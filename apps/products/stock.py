@@ -0,0 +1,103 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+
+from .cache import invalidate_parts_cache
+from .models import Part
+from .tasks import request_replenishment
+
+
+class InsufficientStock(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Estoque insuficiente.'
+    default_code = 'insufficient_stock'
+
+    def __init__(self, detail=None, code=None):
+        super().__init__(detail, code)
+        if isinstance(detail, dict):
+            # Mantém ids e quantidades como números na resposta, em vez de
+            # convertê-los para ``ErrorDetail``
+            self.detail = detail
+
+
+def reserve_stock(part_id, quantity):
+    """
+    Baixa ``quantity`` unidades do estoque da peça em um único UPDATE
+    condicionado a ``quantity >= n``, sem ler e regravar a linha, e retorna o
+    estoque restante. Se a peça ficar abaixo do mínimo, agenda a reposição.
+    """
+    table = Part._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET quantity = quantity - %s, updated_at = %s "
+            f"WHERE id = %s AND quantity >= %s RETURNING quantity, quantity < minimum_quantity",
+            [quantity, timezone.now(), part_id, quantity],
+        )
+        row = cursor.fetchone()
+
+    if row is None:
+        # Só no caminho de falha é preciso distinguir peça inexistente
+        available = Part.objects.filter(pk=part_id).values_list('quantity', flat=True).first()
+        if available is None:
+            raise NotFound('Peça não encontrada.')
+        raise InsufficientStock({
+            'detail': 'Estoque insuficiente.',
+            'id': part_id,
+            'requested': quantity,
+            'available': available,
+        })
+
+    invalidate_parts_cache()
+    remaining, below_minimum = row
+    if below_minimum:
+        request_replenishment()
+    return remaining
+
+
+def reserve_stock_batch(items):
+    """
+    Reserva várias peças de uma vez: ou todas as baixas são aplicadas, ou
+    nenhuma. Recebe pares (id, quantidade) e retorna ``{id: estoque restante}``.
+    """
+    requested = {}
+    for part_id, quantity in items:
+        requested[part_id] = requested.get(part_id, 0) + quantity
+
+    table = Part._meta.db_table
+    ids = sorted(requested)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Trava as linhas em ordem de id para que lotes concorrentes que
+        # compartilham peças não entrem em deadlock
+        cursor.execute(
+            f"SELECT id, quantity FROM {table} WHERE id = ANY(%s) ORDER BY id FOR UPDATE",
+            [ids],
+        )
+        available = dict(cursor.fetchall())
+
+        conflicts = [
+            {'id': part_id, 'requested': requested[part_id], 'available': available.get(part_id)}
+            for part_id in ids
+            if available.get(part_id, -1) < requested[part_id]
+        ]
+        if conflicts:
+            missing = [conflict['id'] for conflict in conflicts if conflict['available'] is None]
+            if missing:
+                raise NotFound({'detail': 'Peça não encontrada.', 'ids': missing})
+            raise InsufficientStock({'detail': 'Estoque insuficiente.', 'items': conflicts})
+
+        values = ", ".join(["(%s::bigint, %s::integer)"] * len(ids))
+        params = [timezone.now()]
+        for part_id in ids:
+            params += [part_id, requested[part_id]]
+        cursor.execute(
+            f"UPDATE {table} AS p SET quantity = p.quantity - v.quantity, updated_at = %s "
+            f"FROM (VALUES {values}) AS v (id, quantity) WHERE p.id = v.id "
+            f"RETURNING p.id, p.quantity, p.quantity < p.minimum_quantity",
+            params,
+        )
+        rows = cursor.fetchall()
+        invalidate_parts_cache()
+        if any(below_minimum for _, _, below_minimum in rows):
+            request_replenishment()
+    return {part_id: remaining for part_id, remaining, _ in rows}
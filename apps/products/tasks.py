@@ -1,66 +1,215 @@
-import csv
+from contextlib import nullcontext
 from io import StringIO
 
-from celery import shared_task
+from celery import chord, shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
 
-from .models import Part
+from .cache import invalidate_parts_cache
+from .changes import purge_changes
+from .importers import (ErrorReport, count_staged_rows, import_rows,
+                        iter_csv_rows, iter_staged_rows, merge_results,
+                        split_into_shards)
+from .inventory import compact_inventory, reconcile_inventory
+from .models import ImportJob, Part
+
+REPLENISH_PENDING_KEY = 'parts:replenish:pending'
 
 
 @shared_task
-def import_parts_from_csv(csv_text):
-    f = StringIO(csv_text)
-    reader = csv.DictReader(f)
+def import_parts_from_csv(csv_text=None, batch_size=None, file_path=None, job_id=None, shard=False):
+    if file_path is None:
+        result = import_rows(iter_csv_rows(StringIO(csv_text)), batch_size=batch_size)
+        if result['created'] or result['updated']:
+            request_replenishment()
+        return result
 
-    created = 0
-    updated = 0
-    skipped = 0
+    # Em modo shard o progresso é somado ao job e a finalização fica com o
+    # callback; as linhas já chegam validadas e o relatório vem da divisão
+    job = ImportJob(pk=job_id) if job_id else None
+    with ErrorReport() if job and not shard else nullcontext() as report:
+        try:
+            if job and not shard:
+                job.mark_running(total_rows=count_staged_rows(file_path))
+            result = import_rows(
+                iter_staged_rows(file_path),
+                batch_size=batch_size,
+                on_progress=job.add_progress if job else None,
+                report=report,
+            )
+            if report is not None:
+                job.set_error_report(report.save(job.error_report_name()))
+        except Exception as exc:
+            if job:
+                job.mark_failed(exc)
+            raise
+        finally:
+            default_storage.delete(file_path)
 
-    for row in reader:
-        name = row.get("name") or row.get("nome")
-        description = row.get("description") or row.get("descricao", "")
-        price = row.get("price") or row.get("preco") or 0
-        quantity = row.get("quantity") or row.get("quantidade") or 0
+    # Peças importadas abaixo do mínimo entram na próxima reposição
+    if result['created'] or result['updated']:
+        request_replenishment()
+    if job and not shard:
+        job.mark_finished(result)
+    return result
 
-        if not name:
-            skipped += 1
-            continue
 
+@shared_task(bind=True)
+def import_parts_sharded(self, file_path, shards, batch_size=None, job_id=None):
+    job = ImportJob(pk=job_id) if job_id else None
+    with ErrorReport() if job else nullcontext() as report:
         try:
-            price = float(price)
-            quantity = int(quantity)
-        except ValueError:
-            skipped += 1
-            continue
-
-        obj, created_flag = Part.objects.update_or_create(
-            name=name,
-            price=price,
-            defaults={
-                "description": description,
-                "quantity": quantity,
-            },
-        )
-
-        if created_flag:
-            created += 1
-        else:
-            updated += 1
-
-    return {
-        "created": created,
-        "updated": updated,
-        "skipped": skipped,
-        "total": created + updated + skipped,
-    }
+            if job:
+                job.mark_running()
+            shard_paths, rows, skipped = split_into_shards(file_path, shards, report)
+            if report is not None:
+                job.set_error_report(report.save(job.error_report_name()))
+        except Exception as exc:
+            if job:
+                job.mark_failed(exc)
+            raise
+        finally:
+            default_storage.delete(file_path)
+
+    if job:
+        job.set_total_rows(rows + skipped)
+        job.add_progress(skipped=skipped)
+
+    if not shard_paths:
+        return merge_import_results([], skipped=skipped, job_id=job_id)
+
+    header = [
+        import_parts_from_csv.s(file_path=shard_path, batch_size=batch_size, job_id=job_id, shard=True)
+        for shard_path in shard_paths
+    ]
+    callback = merge_import_results.s(skipped=skipped, job_id=job_id)
+    return self.replace(chord(header, callback))
+
+
+@shared_task
+def merge_import_results(results, skipped=0, job_id=None):
+    result = merge_results(results, skipped=skipped)
+    if job_id:
+        ImportJob(pk=job_id).mark_finished(result)
+    return result
+
+
+def request_replenishment():
+    """
+    Agenda, após o commit, a reposição das peças que ficaram abaixo do
+    próprio mínimo. A task roda ``PARTS_REPLENISH_DELAY_SECONDS`` depois, e
+    os pedidos feitos até lá são absorvidos por ela: uma rajada de reservas
+    gera uma única execução.
+
+    Com ``PARTS_REPLENISH_ON_WRITE`` desligado (ex.: no benchmark), não
+    agenda nada e a reposição fica só com a varredura periódica.
+    """
+    if settings.PARTS_REPLENISH_ON_WRITE:
+        transaction.on_commit(_enqueue_replenishment, robust=True)
+
+
+def _enqueue_replenishment():
+    delay = settings.PARTS_REPLENISH_DELAY_SECONDS
+    # A marca expira a tempo da varredura periódica. Se a publicação falhar
+    # ela continua valendo: as próximas escritas não insistem com o broker
+    # fora do ar e a varredura cobre o pedido perdido
+    if not cache.add(REPLENISH_PENDING_KEY, True, timeout=delay + settings.PARTS_REPLENISH_SWEEP_SECONDS):
+        return
+    replenish_low_stock.apply_async(countdown=delay, retry=False)
 
 
 @shared_task
-def replenish_stock_minimum(minimum=10):
-    parts = Part.objects.filter(quantity__lt=minimum)
+def replenish_low_stock(chunk_size=None):
+    """
+    Repõe as peças com ``quantity < minimum_quantity`` para
+    max(minimum_quantity, quantity + reorder_quantity), percorrendo o índice
+    parcial ``part_low_stock_idx``, que só contém essas peças.
+
+    Agendada por ``request_replenishment`` e, como rede de segurança, pelo
+    Celery Beat a cada ``PARTS_REPLENISH_SWEEP_SECONDS``.
+    """
+    # Pedidos feitos a partir daqui agendam uma nova execução
+    cache.delete(REPLENISH_PENDING_KEY)
+    chunk_size = chunk_size or settings.PARTS_REPLENISH_CHUNK_SIZE
+    table = Part._meta.db_table
+
+    # Peças travadas por uma reserva em andamento ficam para a próxima
+    # execução em vez de segurar o bloco inteiro
     updated = []
-    for p in parts:
-        p.quantity = minimum
-        p.save()
-        updated.append(p.id)
-    
-    return {'updated_count': len(updated)}
\ No newline at end of file
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table}
+                SET quantity = GREATEST(minimum_quantity, quantity + reorder_quantity), updated_at = %s
+                WHERE id IN (
+                    SELECT id FROM {table}
+                    WHERE quantity < minimum_quantity
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id
+                """,
+                [timezone.now(), chunk_size],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if ids:
+                invalidate_parts_cache()
+        updated.extend(ids)
+        if len(ids) < chunk_size:
+            break
+
+    return {'updated_count': len(updated), 'updated_ids': updated}
+
+
+@shared_task
+def replenish_stock_minimum(minimum=10, chunk_size=None):
+    chunk_size = chunk_size or settings.PARTS_REPLENISH_CHUNK_SIZE
+    table = Part._meta.db_table
+
+    # UPDATE ... RETURNING em blocos curtos: cada bloco é uma transação
+    # própria, então os locks de linha duram apenas o tempo de um bloco
+    updated = []
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {table} SET quantity = %s, updated_at = %s
+                WHERE id IN (
+                    SELECT id FROM {table}
+                    WHERE quantity < %s
+                    ORDER BY id
+                    LIMIT %s
+                    FOR UPDATE
+                )
+                RETURNING id
+                """,
+                [minimum, timezone.now(), minimum, chunk_size],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            if ids:
+                invalidate_parts_cache()
+        updated.extend(ids)
+        if len(ids) < chunk_size:
+            break
+
+    return {'updated_count': len(updated), 'updated_ids': updated}
+
+
+@shared_task
+def purge_part_changes():
+    return {'deleted_count': purge_changes()}
+
+
+@shared_task
+def reconcile_inventory_summary():
+    return {'drift': {field: str(value) for field, value in reconcile_inventory().items()}}
+
+
+@shared_task
+def compact_inventory_summary():
+    return {'compacted_rows': compact_inventory()}
@@ -1,20 +1,53 @@
-from io import BytesIO
+import asyncio
+import gzip
+import json
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 from pathlib import Path
 from unittest.mock import patch
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import (AsyncRequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
+from django.utils import timezone
+from celery.worker.request import Request
+from kombu.exceptions import OperationalError
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import Part
-from .tasks import import_parts_from_csv, replenish_stock_minimum
+from marketplace import celery_app
+from marketplace.authentication import user_cache_key
+from marketplace.metrics import registry
+
+from .async_views import AsyncPartDetailView, AsyncPartListView
+from .changes import encode_cursor
+from .models import ImportJob, InventorySummary, Part, PartChange
+from .serializers import PartListSerializer
+from .importers import split_into_shards
+from .tasks import (REPLENISH_PENDING_KEY, _enqueue_replenishment,
+                    compact_inventory_summary, import_parts_from_csv,
+                    import_parts_sharded, purge_part_changes,
+                    reconcile_inventory_summary, replenish_low_stock,
+                    replenish_stock_minimum, request_replenishment)
 
 
 class PartViewsTest(APITestCase):
     
     def setUp(self):
+        cache.clear()
         self.admin_user = User.objects.create_superuser(username="admin", password="pass")
         self.regular_user = User.objects.create_user(username="user", password="pass")
         self.part1 = Part.objects.create(name="Peça 1", description="Desc 1", price=10.0, quantity=5)
@@ -28,6 +61,78 @@ class PartViewsTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data['results']), 2)
 
+    def test_list_parts_cursor_pagination_walks_catalog(self):
+        for i in range(15):
+            Part.objects.create(name="Peça 1", description="", price=100 + i, quantity=1)
+        self.client.force_authenticate(user=self.regular_user)
+
+        url = reverse("part-list") + "?cursor="
+        seen = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+
+        expected = list(Part.objects.order_by("name", "id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_list_parts_invalid_cursor(self):
+        self.client.force_authenticate(user=self.regular_user)
+        response = self.client.get(reverse("part-list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_parts_search_and_filters(self):
+        brake = Part.objects.create(name="Pastilha de freio dianteira", description="Cerâmica", price=120, quantity=0)
+        oil = Part.objects.create(name="Filtro de óleo", description="Motor 1.0 com freio motor", price=35, quantity=4)
+        self.client.force_authenticate(user=self.regular_user)
+        url = reverse("part-list")
+
+        def ids(params):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return {item["id"] for item in response.data["results"]}
+
+        self.assertEqual(ids({"q": "freio"}), {brake.id, oil.id})
+        self.assertEqual(ids({"q": "pastilh"}), {brake.id})
+        self.assertEqual(ids({"price_min": "30", "price_max": "100"}), {oil.id})
+        self.assertEqual(ids({"in_stock": "false"}), {brake.id})
+        self.assertEqual(ids({"in_stock": "true", "price_min": "15"}), {self.part2.id, oil.id})
+
+    def test_list_parts_search_keeps_relevance_with_cursor(self):
+        hose = Part.objects.create(name="Abraçadeira", description="Para mangueira do filtro", price=5, quantity=1)
+        air = Part.objects.create(name="Filtro de ar", description="", price=40, quantity=1)
+        self.client.force_authenticate(user=self.regular_user)
+
+        response = self.client.get(reverse("part-list"), {"q": "filtro", "cursor": ""})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item["id"] for item in response.data["results"]], [air.id, hose.id])
+        self.assertEqual(response.data["count"], 2)
+
+    def test_list_parts_invalid_filters(self):
+        self.client.force_authenticate(user=self.regular_user)
+        response = self.client.get(reverse("part-list"), {"price_min": "10", "price_max": "5"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse("part-list"), {"price_min": "abc"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_parts_fast_path_is_byte_compatible(self):
+        Part.objects.create(name="Peça \u2028 “especial”", description="Linha\nnova", price="1234.50", quantity=0)
+        self.client.force_authenticate(user=self.regular_user)
+
+        response = self.client.get(reverse("part-list"), {"page": 1})
+
+        parts = Part.objects.all()
+        expected = {
+            "count": parts.count(),
+            "next": None,
+            "previous": None,
+            "results": PartListSerializer(parts, many=True).data,
+        }
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+
     def test_list_parts_unauthenticated(self):
         url = reverse("part-list")
         response = self.client.get(url)
@@ -56,6 +161,186 @@ class PartViewsTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["name"], self.part1.name)
 
+    def test_retrieve_part_cached_and_invalidated_on_update(self):
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse("part-detail", args=[self.part1.id])
+
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.data, first.data)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {"quantity": 99})
+
+        response = self.client.get(url)
+        self.assertEqual(response.data["quantity"], 99)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_list_parts_if_none_match_returns_not_modified(self):
+        self.client.force_authenticate(user=self.regular_user)
+        url = reverse("part-list")
+
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(response.content)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            replenish_stock_minimum(minimum=10)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_retrieve_missing_part_with_current_etag_returns_not_found(self):
+        self.client.force_authenticate(user=self.regular_user)
+        etag = self.client.get(reverse("part-detail", args=[self.part1.id]))["ETag"]
+
+        response = self.client.get(reverse("part-detail", args=[999999]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(reverse("part-list"), {"price_min": "abc"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_parts_reports_server_timing_and_metrics(self):
+        self.client.force_authenticate(user=self.regular_user)
+        response = self.client.get(reverse("part-list"))
+
+        timing = response["Server-Timing"]
+        for phase in ("serialize", "render", "db", "total"):
+            self.assertIn(f"{phase};dur=", timing)
+
+        with override_settings(METRICS_TOKEN="segredo"):
+            metrics = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer segredo").content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="part-list",method="GET"}', metrics)
+        self.assertIn('http_request_phase_seconds_total{view="part-list",phase="db"}', metrics)
+        self.assertNotIn('view="metrics"', metrics)
+
+    @override_settings(METRICS_TOKEN="segredo")
+    def test_metrics_require_token_or_staff(self):
+        for url in (reverse("metrics"), reverse("db-pool")):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+            response = self.client.get(url, HTTP_AUTHORIZATION="Bearer errado")
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+            self.client.force_login(self.regular_user)
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+            self.client.force_login(self.admin_user)
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+            self.client.logout()
+
+            response = self.client.get(url, HTTP_AUTHORIZATION="Bearer segredo")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_db_pool_diagnostics(self):
+        self.client.force_login(self.admin_user)
+        response = self.client.get(reverse("db-pool"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pool = response.json()["pools"]["default"]
+        self.assertEqual(pool["max_size"], settings.DATABASES["default"]["OPTIONS"]["pool"]["max_size"])
+        self.assertGreaterEqual(pool["checkouts"], 1)
+        self.assertIn("checkout_wait_ms_avg", pool)
+
+        metrics = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('db_pool_connections{alias="default",state="max"}', metrics)
+        self.assertIn('db_pool_checkouts_total{alias="default"}', metrics)
+
+    @override_settings(PARTS_REPLENISH_ON_WRITE=False)
+    def test_jwt_user_cached_and_invalidated_on_change(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.regular_user)}")
+        url = reverse("part-list")
+        data = {"name": "Nova Peça", "description": "", "price": 15.0, "quantity": 7}
+
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(url, data).status_code, status.HTTP_403_FORBIDDEN)
+
+        entry = cache.get(user_cache_key(self.regular_user.pk))
+        self.assertEqual(set(entry), {"pk", "is_active", "is_staff", "is_superuser", "password_hash"})
+        self.assertNotIn(self.regular_user.password, entry.values())
+
+        self.regular_user.is_staff = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.regular_user.save()
+        self.assertEqual(self.client.post(url, data).status_code, status.HTTP_201_CREATED)
+
+        self.regular_user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.regular_user.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_async_views_match_sync_views(self):
+        token = f"Bearer {AccessToken.for_user(self.regular_user)}"
+        factory = AsyncRequestFactory()
+        list_path = reverse("part-list")
+        detail_path = reverse("part-detail", args=[self.part1.id])
+
+        response = await AsyncPartListView.as_view()(
+            factory.get(list_path, {"cursor": ""}, headers={"authorization": token})
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["id"] for item in json.loads(response.content)["results"]],
+            [self.part1.id, self.part2.id],
+        )
+
+        response = await AsyncPartDetailView.as_view()(
+            factory.get(detail_path, headers={"authorization": token}), pk=self.part1.id
+        )
+        self.assertEqual(json.loads(response.content)["quantity"], 5)
+        self.assertTrue(response.has_header("ETag"))
+        etag = response["ETag"]
+
+        response = await AsyncPartDetailView.as_view()(
+            factory.get(detail_path, headers={"authorization": token, "if-none-match": etag}),
+            pk=self.part1.id,
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = await AsyncPartDetailView.as_view()(
+            factory.get(reverse("part-detail", args=[999999]), headers={"authorization": token, "if-none-match": etag}),
+            pk=999999,
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = await AsyncPartListView.as_view()(factory.get(list_path))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_metrics_flush_runs_off_the_event_loop(self):
+        flushed = threading.Event()
+        flush_threads = []
+
+        def flush():
+            flush_threads.append(threading.get_ident())
+            flushed.set()
+
+        registry.flushed_at = time.monotonic() - settings.METRICS_FLUSH_INTERVAL
+        with patch.object(registry, "flush", side_effect=flush):
+            registry.inc("celery_task_retries_total", task="teste")
+            registry.inc("celery_task_retries_total", task="teste")
+            self.assertTrue(await asyncio.to_thread(flushed.wait, 5))
+
+        self.assertEqual(len(flush_threads), 1)
+        self.assertNotEqual(flush_threads[0], threading.get_ident())
+
+    async def test_async_view_delegates_writes_to_sync_view(self):
+        token = f"Bearer {AccessToken.for_user(self.admin_user)}"
+        request = AsyncRequestFactory().post(
+            reverse("part-list"),
+            {"name": "Nova", "description": "", "price": "3.00", "quantity": 1},
+            content_type="application/json",
+            headers={"authorization": token},
+        )
+
+        response = await AsyncPartListView.as_view()(request)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(await Part.objects.filter(name="Nova").aexists())
+
     def test_retrieve_part_unauthenticated(self):
         url = reverse("part-detail", args=[self.part1.id])
         response = self.client.get(url)
@@ -69,6 +354,13 @@ class PartViewsTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data["name"], "Peça Atualizada")
 
+    def test_create_part_duplicate_key_rejected(self):
+        self.client.force_authenticate(user=self.admin_user)
+        data = {"name": "Peça 1", "description": "Outra", "price": "10.00", "quantity": 1}
+        response = self.client.post(reverse("part-list"), data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Part.objects.filter(name="Peça 1").count(), 1)
+
     def test_update_part_non_admin_forbidden(self):
         self.client.force_authenticate(user=self.regular_user)
         url = reverse("part-detail", args=[self.part1.id])
@@ -91,6 +383,318 @@ class PartViewsTest(APITestCase):
         self.assertTrue(Part.objects.filter(id=self.part1.id).exists())
 
 
+    @override_settings(PARTS_REPLENISH_ON_WRITE=False)
+    def test_bulk_operations_applied_in_one_request(self):
+        self.client.force_authenticate(user=self.admin_user)
+        operations = [
+            {"op": "create", "data": {"name": "Nova", "price": "5.00", "quantity": 1}},
+            {"op": "update", "id": self.part1.id, "data": {"price": "12.50"}},
+            {"op": "delete", "id": self.part2.id},
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("part-bulk"), {"operations": operations}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["status"] for r in response.data["results"]], ["created", "updated", "deleted"])
+        self.assertTrue(Part.objects.filter(id=response.data["results"][0]["id"], name="Nova").exists())
+        self.part1.refresh_from_db()
+        self.assertEqual(str(self.part1.price), "12.50")
+        self.assertEqual(self.part1.quantity, 5)
+        self.assertFalse(Part.objects.filter(id=self.part2.id).exists())
+
+    def test_bulk_operations_validated_together(self):
+        self.client.force_authenticate(user=self.admin_user)
+        operations = [
+            {"op": "update", "id": self.part1.id, "data": {"price": "99.00"}},
+            {"op": "update", "id": 999999, "data": {"price": "1.00"}},
+            {"op": "create", "data": {"name": "Sem preço"}},
+            {"op": "delete"},
+        ]
+
+        response = self.client.post(reverse("part-bulk"), {"operations": operations}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([r["status"] for r in response.data["results"]], ["valid", "error", "error", "error"])
+        self.assertIn("price", response.data["results"][2]["errors"])
+        self.part1.refresh_from_db()
+        self.assertEqual(str(self.part1.price), "10.00")
+
+    def test_bulk_create_existing_key_updates_part(self):
+        self.client.force_authenticate(user=self.admin_user)
+        operations = [
+            {"op": "create", "data": {"name": "Peça 1", "price": "10.00", "quantity": 42}},
+            {"op": "create", "data": {"name": "Peça 3", "price": "30.00", "quantity": 1}},
+        ]
+
+        response = self.client.post(reverse("part-bulk"), {"operations": operations}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["status"] for r in response.data["results"]], ["updated", "created"])
+        self.assertEqual(response.data["results"][0]["id"], self.part1.id)
+        self.part1.refresh_from_db()
+        self.assertEqual(self.part1.quantity, 42)
+        self.assertEqual(Part.objects.count(), 3)
+
+    def test_bulk_operations_reject_duplicate_keys(self):
+        self.client.force_authenticate(user=self.admin_user)
+        operations = [
+            {"op": "create", "data": {"name": "Nova", "price": "5.00"}},
+            {"op": "create", "data": {"name": "Nova", "price": "5.00"}},
+        ]
+        response = self.client.post(reverse("part-bulk"), {"operations": operations}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([r["status"] for r in response.data["results"]], ["valid", "error"])
+
+        operations = [
+            {"op": "update", "id": self.part2.id, "data": {"name": "Peça 1", "price": "10.00"}},
+            {"op": "update", "id": self.part1.id, "data": {"quantity": 1}},
+        ]
+        response = self.client.post(reverse("part-bulk"), {"operations": operations}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([r["status"] for r in response.data["results"]], ["error", "valid"])
+        self.part1.refresh_from_db()
+        self.assertEqual(self.part1.quantity, 5)
+
+    def test_bulk_operations_non_admin_forbidden(self):
+        self.client.force_authenticate(user=self.regular_user)
+        operations = [{"op": "delete", "id": self.part1.id}]
+        response = self.client.post(reverse("part-bulk"), {"operations": operations}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertTrue(Part.objects.filter(id=self.part1.id).exists())
+
+    def test_reserve_stock_decrements_quantity(self):
+        self.client.force_authenticate(user=self.regular_user)
+        url = reverse("part-reserve", args=[self.part1.id])
+
+        with self.assertNumQueries(1):
+            response = self.client.post(url, {"quantity": 3}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"id": self.part1.id, "quantity": 2})
+        self.part1.refresh_from_db()
+        self.assertEqual(self.part1.quantity, 2)
+
+    @patch("apps.products.tasks.replenish_low_stock.apply_async")
+    def test_reservations_below_minimum_enqueue_one_replenishment(self, mock_replenish):
+        self.client.force_authenticate(user=self.regular_user)
+        reserve = reverse("part-reserve", args=[self.part2.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reserve, {"quantity": 1}, format="json")
+            self.client.post(reverse("part-reserve-batch"), {"items": [{"id": self.part2.id, "quantity": 1}]}, format="json")
+        mock_replenish.assert_called_once_with(countdown=settings.PARTS_REPLENISH_DELAY_SECONDS, retry=False)
+
+        # Sem ficar abaixo do mínimo não há pedido
+        mock_replenish.reset_mock()
+        Part.objects.filter(pk=self.part1.pk).update(minimum_quantity=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("part-reserve", args=[self.part1.id]), {"quantity": 1}, format="json")
+        mock_replenish.assert_not_called()
+
+        # Depois que a reposição roda, uma nova baixa volta a agendar
+        replenish_low_stock()
+        self.part2.refresh_from_db()
+        self.assertEqual(self.part2.quantity, 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reserve, {"quantity": 1}, format="json")
+        mock_replenish.assert_called_once()
+
+    @patch("apps.products.tasks.replenish_low_stock.apply_async")
+    def test_replenishment_requests_are_deduplicated(self, mock_replenish):
+        cache.delete(REPLENISH_PENDING_KEY)
+        mock_replenish.side_effect = OperationalError("broker fora do ar")
+
+        # A falha ao publicar não libera a marca: a próxima escrita não insiste
+        with self.assertRaises(OperationalError):
+            _enqueue_replenishment()
+        _enqueue_replenishment()
+        mock_replenish.assert_called_once_with(countdown=settings.PARTS_REPLENISH_DELAY_SECONDS, retry=False)
+        self.assertTrue(cache.get(REPLENISH_PENDING_KEY))
+
+        # A task libera a marca ao rodar
+        replenish_low_stock()
+        self.assertIsNone(cache.get(REPLENISH_PENDING_KEY))
+
+        with override_settings(PARTS_REPLENISH_ON_WRITE=False):
+            with self.captureOnCommitCallbacks() as callbacks:
+                request_replenishment()
+        self.assertEqual(callbacks, [])
+
+    @patch("apps.products.tasks.replenish_low_stock.apply_async")
+    def test_bulk_create_keeps_replenishment_settings(self, mock_replenish):
+        self.client.force_authenticate(user=self.admin_user)
+        operations = [
+            {"op": "create", "data": {"name": "Nova", "price": "5.00", "quantity": 1,
+                                      "minimum_quantity": 3, "reorder_quantity": 12}},
+            {"op": "create", "data": {"name": "Outra", "price": "6.00", "quantity": 1, "reorder_quantity": 4}},
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("part-bulk"), {"operations": operations}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        settings_by_name = {
+            name: (minimum, reorder)
+            for name, minimum, reorder in Part.objects.values_list("name", "minimum_quantity", "reorder_quantity")
+        }
+        self.assertEqual(settings_by_name["Nova"], (3, 12))
+        self.assertEqual(settings_by_name["Outra"], (10, 4))
+        mock_replenish.assert_called_once()
+
+    def test_reserve_stock_insufficient(self):
+        self.client.force_authenticate(user=self.regular_user)
+        response = self.client.post(reverse("part-reserve", args=[self.part1.id]), {"quantity": 6}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["available"], 5)
+        self.part1.refresh_from_db()
+        self.assertEqual(self.part1.quantity, 5)
+
+    def test_reserve_stock_part_not_found(self):
+        self.client.force_authenticate(user=self.regular_user)
+        response = self.client.post(reverse("part-reserve", args=[999999]), {"quantity": 1}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_reserve_stock_batch_is_all_or_nothing(self):
+        self.client.force_authenticate(user=self.regular_user)
+        url = reverse("part-reserve-batch")
+
+        items = [{"id": self.part1.id, "quantity": 2}, {"id": self.part2.id, "quantity": 11}]
+        response = self.client.post(url, {"items": items}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual([item["id"] for item in response.data["items"]], [self.part2.id])
+        self.part1.refresh_from_db()
+        self.assertEqual(self.part1.quantity, 5)
+
+        items = [
+            {"id": self.part1.id, "quantity": 2},
+            {"id": self.part2.id, "quantity": 4},
+            {"id": self.part1.id, "quantity": 1},
+        ]
+        response = self.client.post(url, {"items": items}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"], [
+            {"id": self.part1.id, "quantity": 2},
+            {"id": self.part2.id, "quantity": 6},
+        ])
+
+    def test_reserve_stock_unauthenticated(self):
+        response = self.client.post(reverse("part-reserve", args=[self.part1.id]), {"quantity": 1}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_export_csv_reimports_cleanly(self):
+        Part.objects.create(name='Peça, "especial"', description="Linha 1\nLinha 2", price="7.05", quantity=3)
+        self.client.force_authenticate(user=self.regular_user)
+
+        response = self.client.get(reverse("part-export"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode("utf-8")
+        self.assertTrue(content.startswith("nome,descricao,preco,quantidade"))
+
+        Part.objects.all().update(quantity=0)
+        result = import_parts_from_csv(content)
+
+        self.assertEqual(result, {"created": 0, "updated": 3, "unchanged": 0, "skipped": 0, "total": 3})
+        special = Part.objects.get(name='Peça, "especial"')
+        self.assertEqual((special.description, special.quantity), ("Linha 1\nLinha 2", 3))
+
+    def test_export_ndjson(self):
+        self.client.force_authenticate(user=self.regular_user)
+
+        response = self.client.get(reverse("part-export"), {"output": "ndjson"})
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        self.assertEqual(
+            json.loads(lines[0]),
+            {"id": self.part1.id, "name": "Peça 1", "description": "Desc 1", "price": "10.00", "quantity": 5},
+        )
+        self.assertEqual(len(lines), 2)
+
+    async def test_export_streams_asynchronously_under_asgi(self):
+        token = f"Bearer {AccessToken.for_user(self.regular_user)}"
+        response = await self.async_client.get(reverse("part-export"), {"output": "ndjson"}, headers={"authorization": token})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        lines = b"".join([chunk async for chunk in response.streaming_content]).decode("utf-8").splitlines()
+        self.assertEqual([json.loads(line)["id"] for line in lines], [self.part1.id, self.part2.id])
+
+    def test_export_unauthenticated(self):
+        response = self.client.get(reverse("part-export"))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_stats_follow_every_write_path(self):
+        self.client.force_authenticate(user=self.admin_user)
+
+        def assert_stats_match():
+            parts = Part.objects.all()
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse("part-stats"))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                {key: response.data[key] for key in ("sku_count", "total_quantity", "out_of_stock_count", "low_stock_count")},
+                {
+                    "sku_count": parts.count(),
+                    "total_quantity": sum(part.quantity for part in parts),
+                    "out_of_stock_count": parts.filter(quantity=0).count(),
+                    "low_stock_count": parts.filter(quantity__gt=0, quantity__lt=F("minimum_quantity")).count(),
+                },
+            )
+            self.assertEqual(
+                Decimal(response.data["stock_value"]),
+                sum((part.price * part.quantity for part in parts), Decimal(0)),
+            )
+
+        assert_stats_match()
+        self.client.post(reverse("part-list"), {"name": "Nova", "description": "", "price": "2.50", "quantity": 0})
+        self.client.patch(reverse("part-detail", args=[self.part1.id]), {"quantity": 3})
+        self.client.delete(reverse("part-detail", args=[self.part2.id]))
+        assert_stats_match()
+
+        import_parts_from_csv("nome,descricao,preco,quantidade\nNova,,2.50,4\nOutra,,7,20\n")
+        self.client.post(reverse("part-reserve", args=[self.part1.id]), {"quantity": 3}, format="json")
+        assert_stats_match()
+
+        replenish_stock_minimum(minimum=10)
+        self.client.post(reverse("part-bulk"), {"operations": [
+            {"op": "update", "id": self.part1.id, "data": {"price": "11.00"}},
+            {"op": "delete", "id": Part.objects.get(name="Outra").id},
+        ]}, format="json")
+        assert_stats_match()
+
+        # Cada comando acrescenta uma linha; a compactação as junta sem mudar os totais
+        rows = InventorySummary.objects.count()
+        self.assertGreater(rows, 1)
+        self.assertEqual(compact_inventory_summary(), {"compacted_rows": rows})
+        self.assertEqual(compact_inventory_summary(), {"compacted_rows": 0})
+        self.assertEqual(InventorySummary.objects.count(), 1)
+        assert_stats_match()
+
+    @override_settings(PARTS_INVENTORY_MAX_ROWS=2)
+    def test_stats_compact_summary_past_max_rows(self):
+        self.client.force_authenticate(user=self.regular_user)
+        InventorySummary.objects.create(sku_count=1, stock_value=Decimal("1.00"))
+        InventorySummary.objects.create(sku_count=-1, stock_value=Decimal("-1.00"))
+
+        response = self.client.get(reverse("part-stats"))
+        self.assertEqual((response.data["sku_count"], response.data["stock_value"]), (2, "250.00"))
+        self.assertEqual(InventorySummary.objects.count(), 1)
+
+    def test_reconcile_inventory_summary_fixes_drift(self):
+        self.assertEqual(reconcile_inventory_summary(), {"drift": {}})
+
+        InventorySummary.objects.create(sku_count=5, stock_value=Decimal("12.50"))
+        self.assertEqual(reconcile_inventory_summary(), {"drift": {"sku_count": "-5", "stock_value": "-12.50"}})
+        self.assertEqual(InventorySummary.objects.count(), 1)
+
+        self.client.force_authenticate(user=self.regular_user)
+        response = self.client.get(reverse("part-stats"))
+        self.assertEqual((response.data["sku_count"], response.data["stock_value"]), (2, "250.00"))
+
     @patch("apps.products.views.import_parts_from_csv.delay")
     def test_import_csv_admin_file(self, mock_task):
         self.client.force_authenticate(user=self.admin_user)
@@ -104,6 +708,156 @@ class PartViewsTest(APITestCase):
         mock_task.assert_called_once()
         self.assertIn("detail", response.data)
 
+    def test_import_publish_records_queue_wait_in_worker(self):
+        self.client.force_authenticate(user=self.admin_user)
+        task = "apps.products.tasks.import_parts_from_csv"
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            # Consome a mensagem publicada pela view (broker em memória nos
+            # testes) e a executa como o worker faria
+            with celery_app.connection_for_read() as conn:
+                queue = conn.SimpleQueue("celery")
+                queue.clear()
+                with open("docs/planilha.csv", "rb") as f:
+                    response = self.client.post(reverse("part-import"), {"file": f}, format="multipart")
+                self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+                message = queue.get(timeout=1)
+                queue.close()
+            self.assertEqual(message.headers["task"], task)
+            self.assertIn("enqueued_at", message.headers)
+            Request(message, app=celery_app, task=celery_app.tasks[task]).execute()
+
+        self.assertIn(f'celery_task_queue_wait_seconds_count{{task="{task}"}}', registry.render())
+        self.assertEqual(ImportJob.objects.get(pk=response.data["job_id"]).status, ImportJob.Status.FINISHED)
+
+    @patch("apps.products.views.import_parts_from_csv.delay")
+    def test_import_csv_stages_file_instead_of_content(self, mock_task):
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse("part-import")
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with open("docs/planilha.csv", "rb") as f:
+                response = self.client.post(url, {"file": f}, format="multipart")
+
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            args, kwargs = mock_task.call_args
+            self.assertEqual(args, ())
+            staged_name = kwargs["file_path"]
+            self.assertTrue(default_storage.exists(staged_name))
+
+            result = import_parts_from_csv(file_path=staged_name)
+
+            self.assertFalse(default_storage.exists(staged_name))
+            self.assertEqual(result["total"], Path("docs/planilha.csv").read_text().count("\n") - 1)
+            self.assertTrue(Part.objects.filter(name="Peca 1").exists())
+
+    @patch("apps.products.views.import_parts_from_csv.delay")
+    def test_import_csv_returns_job_that_can_be_polled(self, mock_task):
+        self.client.force_authenticate(user=self.admin_user)
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with open("docs/planilha.csv", "rb") as f:
+                response = self.client.post(reverse("part-import"), {"file": f}, format="multipart")
+
+            job_id = response.data["job_id"]
+            self.assertEqual(mock_task.call_args.kwargs["job_id"], job_id)
+            with override_settings(PARTS_IMPORT_PROGRESS_EVERY=5):
+                import_parts_from_csv(**mock_task.call_args.kwargs)
+
+        self.client.force_authenticate(user=self.regular_user)
+        response = self.client.get(reverse("part-import-job", args=[job_id]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["file_name"], "planilha.csv")
+        self.assertEqual(response.data["status"], ImportJob.Status.FINISHED)
+        self.assertEqual(response.data["rows_processed"], response.data["total_rows"])
+        self.assertEqual(response.data["created_count"], response.data["total_rows"])
+        self.assertEqual(response.data["eta_seconds"], 0)
+
+    @patch("apps.products.views.import_parts_from_csv.delay")
+    def test_import_csv_same_file_is_not_imported_twice(self, mock_task):
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse("part-import")
+
+        def upload(**extra):
+            with open("docs/planilha.csv", "rb") as f:
+                return self.client.post(url, {"file": f, **extra}, format="multipart")
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            first = upload()
+            second = upload()
+            forced = upload(force=True)
+
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data["job_id"], first.data["job_id"])
+        self.assertEqual(forced.status_code, status.HTTP_202_ACCEPTED)
+        self.assertNotEqual(forced.data["job_id"], first.data["job_id"])
+        self.assertEqual(mock_task.call_count, 2)
+
+    @patch("apps.products.views.import_parts_from_csv.delay")
+    def test_import_error_report_can_be_downloaded(self, mock_task):
+        self.client.force_authenticate(user=self.admin_user)
+        upload = BytesIO("nome,descricao,preco,quantidade\nOk,,1,1\nRuim,,1.001,1\n".encode())
+        upload.name = "catalogo.csv"
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post(reverse("part-import"), {"file": upload}, format="multipart")
+            job_id = response.data["job_id"]
+            import_parts_from_csv(**mock_task.call_args.kwargs)
+
+            self.client.force_authenticate(user=self.regular_user)
+            job = self.client.get(reverse("part-import-job", args=[job_id])).data
+            response = self.client.get(job["error_report_url"])
+            content = b"".join(response.streaming_content).decode()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(job["skipped_count"], 1)
+        self.assertEqual(content.splitlines()[1].split(",")[:2], ["3", "preco"])
+
+        clean_job = ImportJob.objects.create(file_name="limpo.csv")
+        response = self.client.get(reverse("part-import-errors", args=[clean_job.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_import_job_not_found(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(reverse("part-import-job", args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch("apps.products.views.import_parts_sharded.delay")
+    @patch("apps.products.views.import_parts_from_csv.delay")
+    def test_import_csv_with_shards_uses_parallel_task(self, mock_task, mock_sharded):
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse("part-import")
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with open("docs/planilha.csv", "rb") as f:
+                response = self.client.post(url, {"file": f, "shards": 4}, format="multipart")
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        mock_task.assert_not_called()
+        self.assertEqual(mock_sharded.call_args.kwargs["shards"], 4)
+
+    @patch("apps.products.views.import_parts_from_csv.delay")
+    def test_import_accepts_compressed_and_ndjson_uploads(self, mock_task):
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse("part-import")
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            upload = BytesIO(gzip.compress(b'{"name": "Nova", "price": "1.00", "quantity": 1}\n'))
+            upload.name = "catalogo.ndjson.gz"
+            response = self.client.post(url, {"file": upload}, format="multipart")
+
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            staged_name = mock_task.call_args.kwargs["file_path"]
+            self.assertTrue(staged_name.endswith(".ndjson.gz"))
+            self.assertEqual(import_parts_from_csv(file_path=staged_name)["created"], 1)
+
+        upload = BytesIO(b"nome,descricao,preco,quantidade\n")
+        upload.name = "catalogo.txt"
+        response = self.client.post(url, {"file": upload}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     @patch("apps.products.views.import_parts_from_csv.delay")
     def test_import_csv_invalid_file(self, mock_task):
         self.client.force_authenticate(user=self.admin_user)
@@ -145,6 +899,94 @@ class PartViewsTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class PartChangesFeedTest(APITransactionTestCase):
+    """
+    O feed só entrega transações confirmadas, então estes testes precisam de
+    commits reais (sem a transação que envolve cada TestCase).
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="pass")
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("part-changes")
+        # Sem mínimo de estoque, para não agendar reposições no commit
+        self.part1 = Part.objects.create(name="Peça 1", price=10, quantity=5, minimum_quantity=0)
+        self.part2 = Part.objects.create(name="Peça 2", price=20, quantity=10, minimum_quantity=0)
+
+    def sync(self, cursor=None, limit=None):
+        changed, deleted = [], []
+        while True:
+            params = {key: value for key, value in (("since", cursor), ("limit", limit)) if value}
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            changed += [item["id"] for item in response.data["changed"]]
+            deleted += [item["id"] for item in response.data["deleted"]]
+            cursor = response.data["cursor"]
+            if not response.data["has_more"]:
+                return changed, deleted, cursor
+
+    def test_changes_feed_returns_changes_and_deletions_since_cursor(self):
+        first = self.client.get(self.url, {"limit": 1}).data
+        self.assertEqual([item["id"] for item in first["changed"]], [self.part1.id])
+        self.assertTrue(first["has_more"])
+        changed, deleted, cursor = self.sync(first["cursor"], limit=1)
+        self.assertEqual((changed, deleted), ([self.part2.id], []))
+
+        self.part1.quantity = 4
+        self.part1.save()
+        deleted_id = self.part2.id
+        self.part2.delete()
+        part3 = Part.objects.create(name="Peça 3", price=30, quantity=1, minimum_quantity=0)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {"since": cursor})
+        self.assertEqual([item["id"] for item in response.data["changed"]], [self.part1.id, part3.id])
+        self.assertEqual(response.data["changed"][0]["quantity"], 4)
+        self.assertEqual([item["id"] for item in response.data["deleted"]], [deleted_id])
+        self.assertEqual(self.sync(response.data["cursor"])[:2], ([], []))
+
+    def test_changes_feed_waits_for_in_flight_transactions(self):
+        _, _, cursor = self.sync()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_writer():
+            try:
+                with transaction.atomic():
+                    Part.objects.filter(pk=self.part1.pk).update(quantity=1)
+                    started.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        writer = threading.Thread(target=slow_writer)
+        writer.start()
+        self.assertTrue(started.wait(5))
+        # Confirmada antes da transação mais antiga, fica retida até ela terminar
+        Part.objects.filter(pk=self.part2.pk).update(quantity=2)
+        changed, _, held_cursor = self.sync(cursor)
+        self.assertEqual(changed, [])
+
+        release.set()
+        writer.join()
+        self.assertEqual(self.sync(held_cursor)[0], [self.part1.id, self.part2.id])
+
+    def test_changes_feed_invalid_and_expired_cursor(self):
+        self.assertEqual(self.client.get(self.url, {"since": "not-a-cursor"}).status_code, status.HTTP_404_NOT_FOUND)
+        _, _, synced = self.sync()
+        stale = encode_cursor(("log", 0, 0))
+
+        # Todas as alterações saem da retenção; a mais recente fica como marco
+        entries = PartChange.objects.count()
+        PartChange.objects.update(recorded_at=timezone.now() - timedelta(days=settings.PARTS_CHANGES_RETENTION_DAYS + 30))
+        self.assertEqual(purge_part_changes(), {"deleted_count": entries - 1})
+        self.assertEqual(list(PartChange.objects.values_list("part_id", flat=True)), [None])
+
+        self.assertEqual(self.client.get(self.url, {"since": stale}).status_code, status.HTTP_410_GONE)
+        # Cliente em dia e carga inicial de um catálogo antigo continuam valendo
+        self.assertEqual(self.sync(synced)[:2], ([], []))
+        self.assertEqual(self.sync(limit=1)[:2], ([self.part1.id, self.part2.id], []))
+
+
 class PartTasksTest(TestCase):
     def setUp(self):
         self.existing_part = Part.objects.create(
@@ -177,10 +1019,159 @@ Part Invalid,Invalid Price,abc,5
         new_part = Part.objects.get(name="Part New")
         self.assertEqual(new_part.description, "New Desc")
 
+    def test_import_csv_batched_matches_row_by_row_counts(self):
+        csv_text = """name,description,price,quantity
+Part A,Desc A,10,1
+Part B,Desc B,11,2
+Part A,Desc A2,10,3
+Peça Existente,Updated Desc,20.00,9
+Part C,Desc C,12,x
+Part B,Desc B2,11,4
+"""
+        result = import_parts_from_csv(csv_text, batch_size=2)
+
+        self.assertEqual(result, {"created": 2, "updated": 3, "unchanged": 0, "skipped": 1, "total": 6})
+        self.assertEqual(Part.objects.count(), 3)
+        self.assertEqual(Part.objects.get(name="Part A").description, "Desc A2")
+        self.assertEqual(Part.objects.get(name="Part B").quantity, 4)
+        self.assertEqual(Part.objects.get(name="Peça Existente").quantity, 9)
+
+    def test_import_csv_is_idempotent(self):
+        csv_text = "name,description,price,quantity\nPart A,Desc A,10,1\nPeça Existente,Nova,20,7\n"
+
+        first = import_parts_from_csv(csv_text)
+        updated_at = Part.objects.get(name="Peça Existente").updated_at
+        second = import_parts_from_csv(csv_text + "Part A,Desc A,10,2\n")
+
+        self.assertEqual((first["created"], first["updated"], first["unchanged"]), (1, 1, 0))
+        self.assertEqual((second["created"], second["updated"], second["unchanged"]), (0, 2, 1))
+        self.assertEqual(Part.objects.count(), 2)
+        # linhas sem mudança não são regravadas
+        self.assertEqual(Part.objects.get(name="Peça Existente").updated_at, updated_at)
+        self.assertEqual(Part.objects.get(name="Part A").quantity, 2)
+
+    def test_import_task_records_worker_metrics(self):
+        csv_text = "name,description,price,quantity\nPart A,Desc A,10,1\nPart B,Desc B,11,2\n"
+        import_parts_from_csv.apply(kwargs={"csv_text": csv_text})
+        replenish_stock_minimum.apply(kwargs={"minimum": "x"})
+
+        metrics = registry.render()
+        task = "apps.products.tasks.import_parts_from_csv"
+        self.assertIn(f'celery_task_runtime_seconds_count{{task="{task}",state="SUCCESS"}}', metrics)
+        self.assertIn(f'celery_task_rows_per_second_count{{task="{task}"}}', metrics)
+        self.assertRegex(metrics, rf'celery_task_rows_total{{task="{task}"}} \d+')
+        self.assertIn('celery_task_failures_total{task="apps.products.tasks.replenish_stock_minimum"', metrics)
+
+    def test_import_validates_rows_and_writes_error_report(self):
+        csv_text = (
+            "nome,descricao,preco,quantidade\n"
+            "Part A,Desc,10.50,1\n"
+            "Part B,Desc,abc,1\n"
+            "Part C,Desc,10.005,1\n"
+            "Part D,Desc,100000000,1\n"
+            "Part E,Desc,1,-1\n"
+            "Part F,Desc,1,2.5\n"
+            f"{'x' * 256},Desc,1,1\n"
+            "Part A,Outra,10.5,2\n"
+            ",Sem nome,xyz,1\n"
+            "Part G,Desc,99999999.99,2147483647\n"
+        )
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            staged_name = default_storage.save("imports/erros.csv", BytesIO(csv_text.encode()))
+            job = ImportJob.objects.create(file_name="erros.csv")
+            result = import_parts_from_csv(file_path=staged_name, job_id=job.id, batch_size=4)
+
+            job.refresh_from_db()
+            with default_storage.open(job.error_report) as report:
+                lines = report.read().decode().splitlines()
+
+        self.assertEqual(result, {"created": 2, "updated": 1, "unchanged": 0, "skipped": 7, "total": 10})
+        self.assertEqual(lines[0], "linha,coluna,motivo")
+        errors = [line.split(",", 2)[:2] for line in lines[1:]]
+        self.assertEqual(errors, [
+            ["3", "preco"], ["4", "preco"], ["5", "preco"], ["6", "quantidade"],
+            ["7", "quantidade"], ["8", "nome"], ["9", "nome"], ["10", "nome"], ["10", "preco"],
+        ])
+        self.assertIn("repetida", lines[7])
+        self.assertEqual(Part.objects.get(name="Part A").description, "Outra")
+
+    def test_import_compressed_and_ndjson_files(self):
+        csv_text = "nome,descricao,preco,quantidade\nPart A,Desc A,10,1\nPeça Existente,Nova,20,7\n,Sem nome,1,1\n"
+        ndjson_text = (
+            '{"name": "Part B", "description": "Desc B", "price": 19.99, "quantity": 2}\n'
+            '{"nome": "Peça Existente", "descricao": null, "preco": "20.00", "quantidade": 9}\n'
+            "\n"
+            "not json\n"
+            '{"name": "Part C", "price": "abc", "quantity": 1}\n'
+        )
+        files = {
+            "imports/a.csv.gz": gzip.compress(csv_text.encode()),
+            "imports/b.ndjson": ndjson_text.encode(),
+            "imports/c.ndjson.gz": gzip.compress(ndjson_text.replace("Part B", "Part D").encode()),
+        }
+
+        results = {}
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            for name, content in files.items():
+                staged_name = default_storage.save(name, BytesIO(content))
+                job = ImportJob.objects.create(file_name=name)
+                results[name] = import_parts_from_csv(file_path=staged_name, job_id=job.id)
+                job.refresh_from_db()
+                self.assertEqual(job.status, ImportJob.Status.FINISHED)
+
+        self.assertEqual(results["imports/a.csv.gz"], {"created": 1, "updated": 1, "unchanged": 0, "skipped": 1, "total": 3})
+        self.assertEqual(results["imports/b.ndjson"], {"created": 1, "updated": 1, "unchanged": 0, "skipped": 2, "total": 4})
+        self.assertEqual(results["imports/c.ndjson.gz"], {"created": 1, "updated": 0, "unchanged": 1, "skipped": 2, "total": 4})
+        self.assertEqual(Part.objects.get(name="Part B").price, Decimal("19.99"))
+        existing = Part.objects.get(name="Peça Existente")
+        self.assertEqual((existing.description, existing.quantity), ("", 9))
+
+    def test_import_csv_sharded_aggregates_counts(self):
+        csv_text = "name,description,price,quantity\n" + "".join(
+            f"Part {i % 40},Desc {i},{i % 40},{i}\n" for i in range(120)
+        ) + ",Missing Name,15,2\nPeça Existente,Updated Desc,20,8\n"
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            staged_name = default_storage.save("imports/sharded.csv", BytesIO(csv_text.encode()))
+            job = ImportJob.objects.create(file_name="sharded.csv", shards=4)
+            result = import_parts_sharded.apply(
+                kwargs={"file_path": staged_name, "shards": 4, "batch_size": 7, "job_id": job.id}
+            ).get()
+
+            self.assertEqual(default_storage.listdir("imports")[1], [])
+
+        self.assertEqual(result, {"created": 40, "updated": 81, "unchanged": 0, "skipped": 1, "total": 122})
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.Status.FINISHED)
+        self.assertEqual((job.total_rows, job.rows_processed), (122, 122))
+        self.assertEqual((job.created_count, job.updated_count, job.skipped_count), (40, 81, 1))
+        # a última ocorrência de cada chave prevalece, como na importação sequencial
+        self.assertEqual(Part.objects.get(name="Part 3").quantity, 83)
+        self.assertEqual(Part.objects.get(name="Peça Existente").quantity, 8)
+
+    def test_split_into_shards_keeps_duplicate_keys_together(self):
+        csv_text = "nome,descricao,preco,quantidade\nA,x,1,1\nB,x,2,1\nA,y,1.00,2\nC,x,abc,1\n"
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            staged_name = default_storage.save("imports/split.csv", BytesIO(csv_text.encode()))
+            shard_paths, rows, skipped = split_into_shards(staged_name, 8)
+
+            rows_by_shard = [
+                default_storage.open(path).read().decode().splitlines()[1:] for path in shard_paths
+            ]
+
+        self.assertEqual((rows, skipped), (3, 1))
+        shards_with_a = [
+            [r for r in rows if r.startswith("A,")] for rows in rows_by_shard
+            if any(r.startswith("A,") for r in rows)
+        ]
+        self.assertEqual(shards_with_a, [["A,x,1.00,1", "A,y,1.00,2"]])
+
     def test_import_csv_empty(self):
         csv_text = "nome,descricao,preco,quantidade\n"
         result = import_parts_from_csv(csv_text)
-        self.assertEqual(result, {"created": 0, "updated": 0, "skipped": 0, "total": 0})
+        self.assertEqual(result, {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0, "total": 0})
 
     def test_import_csv_from_real_file(self):
 
@@ -203,6 +1194,21 @@ Part Invalid,Invalid Price,abc,5
         self.assertTrue(Part.objects.filter(name=name).exists())
 
 
+    def test_replenish_low_stock_uses_each_part_settings(self):
+        below = Part.objects.create(name="Abaixo", price=1, quantity=2, minimum_quantity=5)
+        reorder = Part.objects.create(name="Lote", price=2, quantity=1, minimum_quantity=5, reorder_quantity=20)
+        Part.objects.create(name="No mínimo", price=3, quantity=5, minimum_quantity=5)
+        Part.objects.create(name="Sem mínimo", price=4, quantity=0, minimum_quantity=0)
+
+        result = replenish_low_stock(chunk_size=1)
+
+        self.assertEqual(sorted(result["updated_ids"]), sorted([self.existing_part.id, below.id, reorder.id]))
+        self.assertEqual(
+            dict(Part.objects.values_list("name", "quantity")),
+            {"Peça Existente": 10, "Abaixo": 5, "Lote": 21, "No mínimo": 5, "Sem mínimo": 0},
+        )
+        self.assertEqual(replenish_low_stock()["updated_count"], 0)
+
     def test_replenish_stock_minimum_updates_parts(self):
         Part.objects.create(name="Baixa 1", description="", price=5.0, quantity=2)
         Part.objects.create(name="Baixa 2", description="", price=10.0, quantity=0)
@@ -214,6 +1220,21 @@ Part Invalid,Invalid Price,abc,5
         for p in Part.objects.all():
             self.assertGreaterEqual(p.quantity, 10)
 
+    def test_replenish_stock_minimum_in_chunks_returns_ids(self):
+        low = [
+            Part.objects.create(name=f"Baixa {i}", description="", price=i + 1, quantity=i)
+            for i in range(5)
+        ]
+        before = Part.objects.get(pk=low[0].pk).updated_at
+
+        result = replenish_stock_minimum(minimum=10, chunk_size=2)
+
+        expected_ids = sorted([self.existing_part.id] + [p.id for p in low])
+        self.assertEqual(result["updated_count"], 6)
+        self.assertEqual(sorted(result["updated_ids"]), expected_ids)
+        self.assertFalse(Part.objects.filter(quantity__lt=10).exists())
+        self.assertGreater(Part.objects.get(pk=low[0].pk).updated_at, before)
+
     def test_replenish_stock_minimum_no_update_needed(self):
         Part.objects.create(name="Alta 1", description="", price=5, quantity=12)
         Part.objects.create(name="Alta 2", description="", price=10, quantity=15)
@@ -226,6 +1247,32 @@ Part Invalid,Invalid Price,abc,5
             self.assertGreaterEqual(p.quantity, 10)
 
 
+# Transacional para que os callbacks de on_commit (cache e reposição) rodem
+# de verdade, com o cache padrão apontando para um Redis inexistente
+@override_settings(CACHES={"default": {
+    "BACKEND": "django.core.cache.backends.redis.RedisCache",
+    "LOCATION": "redis://127.0.0.1:1/0",
+}})
+class BenchCommandTest(TransactionTestCase):
+    @patch("apps.products.tasks.replenish_low_stock.apply_async")
+    def test_bench_runs_scenarios_and_cleans_up(self, mock_replenish):
+        # bulk_create não dispara os signals, que usariam o Redis
+        [real_part] = Part.objects.bulk_create([Part(name="Peça real", price=5, quantity=1)])
+        output = StringIO()
+        call_command(
+            "bench", scenario=["import", "list", "detail", "replenish"],
+            rows=30, requests=3, stdout=output,
+        )
+        mock_replenish.assert_not_called()
 
-
-
+        results = json.loads(output.getvalue())
+        self.assertEqual(results["import"]["first_load"]["created"], 30)
+        self.assertEqual(results["import"]["reimport"]["unchanged"], 30)
+        self.assertEqual(results["import"]["daily"]["updated"], 1)
+        self.assertEqual(results["list"]["first_page_cached"]["queries_per_request"], 0)
+        self.assertEqual(results["detail"]["cold"]["queries_per_request"], 1)
+        self.assertEqual(results["replenish"]["idle"]["updated_count"], 0)
+        self.assertIn("p99_ms", results["list"]["search"])
+        self.assertFalse(Part.objects.filter(name__startswith="bench:").exists())
+        real_part.refresh_from_db()
+        self.assertEqual(real_part.quantity, 1)
@@ -1,15 +1,32 @@
+from django.conf import settings
 from django.urls import path
 from django.views.generic import RedirectView
 from drf_spectacular.views import (SpectacularAPIView, SpectacularRedocView,
                                    SpectacularSwaggerView)
 
+from .async_views import AsyncPartDetailView, AsyncPartListView
 from .views import *
 
+if settings.PARTS_ASYNC_VIEWS:
+    part_list_view = AsyncPartListView.as_view()
+    part_detail_view = AsyncPartDetailView.as_view()
+else:
+    part_list_view = PartListView.as_view()
+    part_detail_view = PartDetailView.as_view()
+
 urlpatterns = [
     path('', RedirectView.as_view(url='schema/swagger/')),
-    path('parts/', PartListView.as_view(), name='part-list'),
-    path('parts/<int:pk>/', PartDetailView.as_view(), name='part-detail'),
+    path('parts/', part_list_view, name='part-list'),
+    path('parts/<int:pk>/', part_detail_view, name='part-detail'),
+    path('parts/<int:pk>/reserve/', PartReserveView.as_view(), name='part-reserve'),
+    path('parts/reserve/', PartReserveBatchView.as_view(), name='part-reserve-batch'),
+    path('parts/bulk/', PartBulkView.as_view(), name='part-bulk'),
+    path('parts/export/', PartExportView.as_view(), name='part-export'),
+    path('parts/changes/', PartChangesView.as_view(), name='part-changes'),
+    path('parts/stats/', PartStatsView.as_view(), name='part-stats'),
     path('parts/import-csv/', PartImportView.as_view(), name='part-import'),
+    path('parts/import-csv/<int:pk>/', ImportJobDetailView.as_view(), name='part-import-job'),
+    path('parts/import-csv/<int:pk>/errors/', ImportJobErrorReportView.as_view(), name='part-import-errors'),
 ]
 
 #  Swagger e Redoc
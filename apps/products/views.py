@@ -1,26 +1,132 @@
+import os
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                           TrigramWordSimilarity)
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import FileResponse, StreamingHttpResponse
 from drf_spectacular.utils import OpenApiResponse, extend_schema
 from rest_framework import status
-from rest_framework.generics import (ListCreateAPIView,
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import (ListCreateAPIView, RetrieveAPIView,
                                      RetrieveUpdateDestroyAPIView)
 from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Part
+from marketplace.metrics import timed
+
+from .bulk import apply_bulk_operations
+from .cache import cached_response
+from .changes import decode_cursor, encode_cursor, get_changes
+from .exporters import astream, export_csv, export_ndjson
+from .importers import file_checksum, import_format
+from .inventory import get_inventory_stats
+from .models import PART_SEARCH_VECTOR, ImportJob, Part
+from .pagination import PartPagination
 from .permissions import IsAdminOrReadOnly
-from .serializers import (PartDetailSerializer, PartImportSerializer,
-                          PartListSerializer)
-from .tasks import import_parts_from_csv
+from .serializers import (ImportJobSerializer, InventoryStatsSerializer,
+                          PartBulkSerializer, PartChangesSerializer,
+                          PartDetailSerializer, PartExportSerializer,
+                          PartFilterSerializer, PartImportSerializer,
+                          PartListSerializer, PartReserveBatchSerializer,
+                          PartReserveSerializer, compile_row_converter)
+from .stock import reserve_stock, reserve_stock_batch
+from .tasks import import_parts_from_csv, import_parts_sharded
 
 
 class PartListView(ListCreateAPIView):
     """
     Permite Listar e Cadastrar Peças.
+
+    Para percorrer o catálogo inteiro, envie ``?cursor=`` e siga o link
+    ``next``: a paginação por cursor não conta registros nem usa OFFSET.
+
+    As respostas ficam em cache e trazem ``ETag``; reenviando o valor em
+    ``If-None-Match`` o servidor responde 304 enquanto o catálogo não mudar.
+
+    Filtros: ``q`` (busca em nome e descrição), ``price_min``, ``price_max``
+    e ``in_stock``.
     """
     queryset = Part.objects.all()
     permission_classes = [IsAdminOrReadOnly, IsAuthenticated]
     serializer_class = PartListSerializer
+    pagination_class = PartPagination
+    _row_converter = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        filters = PartFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = filters.validated_data
+
+        if params.get("q"):
+            # Full-text cobre palavras inteiras; a similaridade de trigramas
+            # encontra nomes parciais ou com pequenas diferenças de grafia
+            query = SearchQuery(params["q"], config="portuguese", search_type="websearch")
+            queryset = (
+                queryset.alias(search=PART_SEARCH_VECTOR)
+                .filter(Q(search=query) | Q(name__trigram_word_similar=params["q"]))
+                # Ordenar por relevância também evita que o planner percorra
+                # o índice de nome inteiro atrás das poucas linhas encontradas
+                .alias(
+                    relevance=SearchRank(PART_SEARCH_VECTOR, query)
+                    + TrigramWordSimilarity(params["q"], "name")
+                )
+                .order_by("-relevance", "name", "id")
+            )
+        if params.get("price_min") is not None:
+            queryset = queryset.filter(price__gte=params["price_min"])
+        if params.get("price_max") is not None:
+            queryset = queryset.filter(price__lte=params["price_max"])
+        if params.get("in_stock") is True:
+            queryset = queryset.filter(quantity__gt=0)
+        elif params.get("in_stock") is False:
+            queryset = queryset.filter(quantity=0)
+        return queryset
+
+    @extend_schema(parameters=[PartFilterSerializer])
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, 'list', self.build_list_data)
+
+    def build_list_data(self):
+        # Caminho rápido de leitura: ``.values()`` e conversão pré-compilada,
+        # com a mesma saída do PartListSerializer
+        convert = self.get_row_converter()
+        queryset = self.filter_queryset(self.get_queryset()).values(*PartListSerializer.Meta.fields)
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            page = list(queryset)
+        with timed('serialize'):
+            results = [convert(row) for row in page]
+        if self.paginator is None:
+            return results
+        return self.get_paginated_response(results).data
+
+    async def abuild_list_data(self):
+        # Mesmo caminho de build_list_data, usado pela view assíncrona
+        convert = self.get_row_converter()
+        queryset = self.filter_queryset(self.get_queryset()).values(*PartListSerializer.Meta.fields)
+        with timed('db'):
+            if self.paginator is None:
+                page = [row async for row in queryset]
+            else:
+                page = await self.paginator.apaginate_queryset(queryset, self.request, view=self)
+        with timed('serialize'):
+            results = [convert(row) for row in page]
+        if self.paginator is None:
+            return results
+        return self.get_paginated_response(results).data
+
+    @classmethod
+    def get_row_converter(cls):
+        if cls._row_converter is None:
+            cls._row_converter = compile_row_converter(PartListSerializer)
+        return cls._row_converter
 
 
 class PartDetailView(RetrieveUpdateDestroyAPIView):
@@ -31,6 +137,197 @@ class PartDetailView(RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAdminOrReadOnly, IsAuthenticated]
     serializer_class = PartDetailSerializer
 
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(request, 'detail', self.build_detail_data)
+
+    def build_detail_data(self):
+        instance = self.get_object()
+        with timed('serialize'):
+            return self.get_serializer(instance).data
+
+    async def abuild_detail_data(self):
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            with timed('db'):
+                instance = await queryset.aget(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        except Part.DoesNotExist:
+            raise NotFound
+        self.check_object_permissions(self.request, instance)
+        with timed('serialize'):
+            return self.get_serializer(instance).data
+
+
+class PartBulkView(APIView):
+    """
+    Cria, atualiza e remove várias peças em uma única requisição.
+
+    Todas as operações são validadas juntas; se alguma tiver erro nada é
+    gravado e a resposta traz o erro de cada item. Caso contrário, o lote é
+    aplicado em uma única transação.
+    """
+    permission_classes = [IsAdminOrReadOnly, IsAuthenticated]
+
+    @extend_schema(
+        request=PartBulkSerializer,
+        responses={
+            200: OpenApiResponse(description="Lote aplicado. Retorna o resultado de cada operação."),
+            400: OpenApiResponse(description="Erro de validação. Nenhuma operação foi aplicada."),
+        },
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = PartBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results, applied = apply_bulk_operations(serializer.validated_data["operations"])
+        return Response(
+            {"results": results},
+            status=status.HTTP_200_OK if applied else status.HTTP_400_BAD_REQUEST,
+        )
+
+
+class PartReserveView(APIView):
+    """
+    Reserva (baixa) unidades do estoque de uma peça de forma atômica.
+
+    A baixa é feita em um único UPDATE condicionado ao estoque disponível,
+    então pedidos concorrentes nunca sobrescrevem uns aos outros. Retorna 409
+    quando não há estoque suficiente.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        request=PartReserveSerializer,
+        responses={
+            200: OpenApiResponse(description="Reserva efetuada. Retorna o estoque restante."),
+            404: OpenApiResponse(description="Peça não encontrada."),
+            409: OpenApiResponse(description="Estoque insuficiente."),
+        },
+    )
+    def post(self, request, pk, *args, **kwargs):
+        serializer = PartReserveSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        remaining = reserve_stock(pk, serializer.validated_data["quantity"])
+        return Response({"id": pk, "quantity": remaining})
+
+
+class PartReserveBatchView(APIView):
+    """
+    Reserva várias peças em uma única transação: ou todas as baixas são
+    aplicadas, ou nenhuma (409 com os itens sem estoque suficiente).
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        request=PartReserveBatchSerializer,
+        responses={
+            200: OpenApiResponse(description="Reservas efetuadas. Retorna o estoque restante de cada peça."),
+            404: OpenApiResponse(description="Alguma peça não foi encontrada."),
+            409: OpenApiResponse(description="Estoque insuficiente para algum item."),
+        },
+    )
+    def post(self, request, *args, **kwargs):
+        serializer = PartReserveBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        remaining = reserve_stock_batch(
+            (item["id"], item["quantity"]) for item in serializer.validated_data["items"]
+        )
+        return Response({
+            "results": [{"id": pk, "quantity": quantity} for pk, quantity in sorted(remaining.items())],
+        })
+
+
+class PartChangesView(APIView):
+    """
+    Feed de alterações para sincronizar cópias do catálogo.
+
+    Retorna as peças criadas ou alteradas e os ids das peças removidas depois
+    do cursor ``since``, em ordem de confirmação, e o ``cursor`` a ser
+    enviado na chamada seguinte. Enquanto ``has_more`` for verdadeiro, há
+    mais alterações a buscar. A consulta percorre o registro de alterações
+    gravado pelo banco, então o custo acompanha o volume de alterações, não o
+    tamanho do catálogo.
+
+    Cursores que ficaram para trás das alterações apagadas após
+    ``PARTS_CHANGES_RETENTION_DAYS`` recebem 410: o cliente deve baixar o
+    catálogo completo e recomeçar sem ``since``.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[PartChangesSerializer],
+        responses={
+            200: OpenApiResponse(description="Alterações (changed), remoções (deleted), cursor e has_more."),
+            404: OpenApiResponse(description="Cursor inválido."),
+            410: OpenApiResponse(description="Cursor expirado; é preciso sincronizar o catálogo completo."),
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        serializer = PartChangesSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        since = serializer.validated_data.get("since")
+        limit = serializer.validated_data.get("limit", settings.PARTS_CHANGES_PAGE_SIZE)
+
+        changed, deleted, position, has_more = get_changes(decode_cursor(since) if since else None, limit)
+        return Response({
+            "changed": changed,
+            "deleted": deleted,
+            "cursor": encode_cursor(position) if position else None,
+            "has_more": has_more,
+        })
+
+
+class PartStatsView(APIView):
+    """
+    Totais do estoque para dashboards: quantidade de peças (SKUs), unidades,
+    valor total (preço x quantidade) e peças zeradas ou abaixo do próprio
+    ``minimum_quantity``.
+
+    Os totais vêm de um resumo mantido pelo banco a cada escrita, então a
+    leitura não percorre o catálogo.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(responses={200: InventoryStatsSerializer})
+    def get(self, request, *args, **kwargs):
+        return Response(InventoryStatsSerializer(get_inventory_stats()).data)
+
+
+class PartExportView(APIView):
+    """
+    Exporta o catálogo completo em CSV (``?output=csv``, padrão) ou NDJSON
+    (``?output=ndjson``).
+
+    A resposta é enviada em streaming a partir de um cursor no servidor, então
+    o consumo de memória não depende do tamanho do catálogo, inclusive sob
+    ASGI, onde o conteúdo sai por um iterador assíncrono. O CSV usa as
+    colunas nome, descricao, preco, quantidade e pode ser reimportado.
+    """
+    permission_classes = [IsAdminOrReadOnly, IsAuthenticated]
+    formats = {
+        "csv": (export_csv, "text/csv; charset=utf-8"),
+        "ndjson": (export_ndjson, "application/x-ndjson"),
+    }
+
+    @extend_schema(
+        parameters=[PartExportSerializer],
+        responses={200: OpenApiResponse(description="Arquivo com o catálogo de peças.")},
+    )
+    def get(self, request, *args, **kwargs):
+        serializer = PartExportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        output = serializer.validated_data["output"]
+
+        generator, content_type = self.formats[output]
+        chunks = generator()
+        if isinstance(request._request, ASGIRequest):
+            chunks = astream(chunks)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="pecas.{output}"'
+        return response
+
 
 class PartImportView(APIView):
     """
@@ -38,6 +335,17 @@ class PartImportView(APIView):
     para popular peças.
 
     O CSV deve conter as seguintes colunas com cabecalho: nome, descricao, preco, quantidade
+
+    Também são aceitos NDJSON (um objeto por linha, com as mesmas chaves ou
+    name/description/price/quantity) e os dois formatos compactados com gzip
+    (``.csv.gz``, ``.ndjson.gz``), descompactados em fluxo pelo worker.
+
+    Informando ``shards`` maior que 1, o arquivo é dividido e importado em
+    paralelo por vários workers.
+
+    Um arquivo idêntico a outro já importado (ou em importação) não é
+    processado de novo: a resposta traz o ``job_id`` da importação anterior.
+    Use ``force`` para importar mesmo assim.
     """
     permission_classes = [IsAdminOrReadOnly, IsAuthenticated]
     parser_classes = [MultiPartParser]
@@ -46,7 +354,8 @@ class PartImportView(APIView):
     @extend_schema(
         request=PartImportSerializer,
         responses={
-            202: OpenApiResponse(description="Importação agendada com sucesso."),
+            200: OpenApiResponse(description="Arquivo já importado. Retorna o ``job_id`` da importação anterior."),
+            202: OpenApiResponse(description="Importação agendada com sucesso. Retorna o ``job_id`` para acompanhamento."),
             400: OpenApiResponse(description="Erro de validação do arquivo."),
         },
     )
@@ -55,15 +364,79 @@ class PartImportView(APIView):
         serializer.is_valid(raise_exception=True)
 
         csv_file = serializer.validated_data["file"]
-        csv_content = csv_file.read().decode("utf-8")
-        import_parts_from_csv.delay(csv_content)
+        checksum = file_checksum(csv_file)
+        if not serializer.validated_data["force"]:
+            previous = (
+                ImportJob.objects.filter(checksum=checksum)
+                .exclude(status=ImportJob.Status.FAILED)
+                .first()
+            )
+            if previous is not None:
+                return Response(
+                    {
+                        "detail": "Arquivo já importado.",
+                        "message": "Um arquivo idêntico já foi importado; envie force=true para importar novamente.",
+                        "job_id": previous.id,
+                    },
+                    status=status.HTTP_200_OK,
+                )
+
+        # O upload é gravado em disco e apenas o caminho segue pelo broker
+        staged_name = default_storage.save(
+            os.path.join(settings.PARTS_IMPORT_STAGING_DIR, f"{uuid4().hex}{import_format(csv_file.name)}"),
+            csv_file,
+        )
+
+        shards = serializer.validated_data.get("shards", 1)
+        job = ImportJob.objects.create(file_name=csv_file.name, checksum=checksum, shards=shards)
+        if shards > 1:
+            import_parts_sharded.delay(file_path=staged_name, shards=shards, job_id=job.id)
+        else:
+            import_parts_from_csv.delay(file_path=staged_name, job_id=job.id)
 
         return Response(
             {
                 "detail": "Importação agendada com sucesso.",
                 "message": "O arquivo foi recebido e está sendo processado em background.",
+                "job_id": job.id,
             },
             status=status.HTTP_202_ACCEPTED,
         )
 
 
+class ImportJobDetailView(RetrieveAPIView):
+    """
+    Permite acompanhar o andamento de uma importação de planilha: status,
+    linhas processadas, velocidade (linhas/s), tempo estimado restante e
+    contagem de peças criadas, atualizadas e ignoradas.
+    """
+    queryset = ImportJob.objects.all()
+    permission_classes = [IsAdminOrReadOnly, IsAuthenticated]
+    serializer_class = ImportJobSerializer
+
+
+class ImportJobErrorReportView(RetrieveAPIView):
+    """
+    Baixa o relatório CSV de uma importação, com uma linha por problema
+    encontrado: número da linha no arquivo enviado, coluna e motivo. Linhas
+    rejeitadas contam como ignoradas; chaves repetidas são apenas apontadas.
+    """
+    queryset = ImportJob.objects.all()
+    permission_classes = [IsAdminOrReadOnly, IsAuthenticated]
+
+    @extend_schema(
+        responses={
+            200: OpenApiResponse(description="CSV com as colunas linha, coluna, motivo."),
+            404: OpenApiResponse(description="Importação inexistente ou sem problemas encontrados."),
+        },
+    )
+    def get(self, request, *args, **kwargs):
+        job = self.get_object()
+        if not job.error_report or not default_storage.exists(job.error_report):
+            raise NotFound("Esta importação não tem relatório de erros.")
+        return FileResponse(
+            default_storage.open(job.error_report, "rb"),
+            as_attachment=True,
+            filename=os.path.basename(job.error_report),
+            content_type="text/csv; charset=utf-8",
+        )
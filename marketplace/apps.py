@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class MarketplaceConfig(AppConfig):
+    name = 'marketplace'
+
+    def ready(self):
+        from . import authentication  # noqa: F401 (conecta a invalidação do cache de usuários)
@@ -0,0 +1,158 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .metrics import timed
+
+USER_CACHE_KEY = 'auth:user:v2:{}'
+
+# Campos do usuário guardados no cache; os demais são carregados do banco
+# somente se acessados
+CACHED_USER_FIELDS = ('is_active', 'is_staff', 'is_superuser')
+
+
+class TimedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication que registra o tempo de autenticação na fase ``auth``
+    da requisição (cabeçalho ``Server-Timing`` e ``/metrics``).
+
+    A busca do usuário fica em ``load_user``/``aload_user``, para que
+    subclasses troquem a origem sem repetir as verificações do token.
+
+    ``aauthenticate`` é a versão assíncrona usada pelas views async: o token
+    é validado no próprio event loop (só CPU) e o usuário é buscado com o ORM
+    assíncrono.
+    """
+
+    def authenticate(self, request):
+        with timed('auth'):
+            return super().authenticate(request)
+
+    async def aauthenticate(self, request):
+        with timed('auth'):
+            header = self.get_header(request)
+            if header is None:
+                return None
+
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        return self.check_user(self.load_user(self.get_user_lookup(validated_token)), validated_token)
+
+    async def aget_user(self, validated_token):
+        return self.check_user(await self.aload_user(self.get_user_lookup(validated_token)), validated_token)
+
+    def load_user(self, lookup):
+        try:
+            return self.user_model.objects.get(**lookup)
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+    async def aload_user(self, lookup):
+        try:
+            return await self.user_model.objects.aget(**lookup)
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+    def get_user_lookup(self, validated_token):
+        try:
+            return {api_settings.USER_ID_FIELD: validated_token[api_settings.USER_ID_CLAIM]}
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def check_user(self, user, validated_token):
+        self.check_credentials(user.is_active, get_md5_hash_password(user.password), validated_token)
+        return user
+
+    def check_credentials(self, is_active, password_hash, validated_token):
+        # Mesmas verificações do JWTAuthentication.get_user
+        if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != password_hash:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+
+class CachedJWTAuthentication(TimedJWTAuthentication):
+    """
+    TimedJWTAuthentication que busca o usuário do token no cache (Redis) em
+    vez do banco, por ``AUTH_USER_CACHE_TIMEOUT`` segundos. Leituras
+    autenticadas já em cache não fazem nenhuma query.
+
+    O cache guarda só o necessário para autenticar e autorizar: a chave
+    primária, ``CACHED_USER_FIELDS`` e o hash MD5 da senha usado na
+    verificação de token revogado, nunca o hash da própria senha. O usuário
+    devolvido tem os demais campos adiados, carregados do banco se alguma
+    view os acessar.
+
+    A entrada é removida sempre que o usuário é salvo ou apagado
+    (``invalidate_user_cache``), então mudanças em ``is_active``, ``is_staff``
+    ou na senha valem já na requisição seguinte. Alterações feitas com
+    ``QuerySet.update()`` não disparam sinais e só valem após o timeout.
+    """
+
+    def get_user(self, validated_token):
+        lookup = self.get_user_lookup(validated_token)
+        key = user_cache_key(*lookup.values())
+        entry = cache.get(key)
+        if entry is None:
+            entry = user_cache_entry(self.load_user(lookup))
+            cache.set(key, entry, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+        return self.user_from_entry(entry, validated_token)
+
+    async def aget_user(self, validated_token):
+        lookup = self.get_user_lookup(validated_token)
+        key = user_cache_key(*lookup.values())
+        entry = await cache.aget(key)
+        if entry is None:
+            entry = user_cache_entry(await self.aload_user(lookup))
+            await cache.aset(key, entry, timeout=settings.AUTH_USER_CACHE_TIMEOUT)
+        return self.user_from_entry(entry, validated_token)
+
+    def user_from_entry(self, entry, validated_token):
+        self.check_credentials(entry['is_active'], entry['password_hash'], validated_token)
+        field_names = (self.user_model._meta.pk.attname,) + CACHED_USER_FIELDS
+        values = [entry['pk']] + [entry[field] for field in CACHED_USER_FIELDS]
+        return self.user_model.from_db(router.db_for_read(self.user_model), field_names, values)
+
+
+def user_cache_entry(user):
+    entry = {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+    entry['pk'] = user.pk
+    entry['password_hash'] = get_md5_hash_password(user.password)
+    return entry
+
+
+def user_cache_key(user_id):
+    return USER_CACHE_KEY.format(user_id)
+
+
+def invalidate_user_cache(user):
+    """
+    Remove o usuário do cache de autenticação quando a transação corrente for
+    confirmada (imediatamente, se não houver transação aberta).
+    """
+    key = user_cache_key(getattr(user, api_settings.USER_ID_FIELD))
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cache_on_user_change(sender, instance, **kwargs):
+    invalidate_user_cache(instance)
@@ -1,20 +1,67 @@
 import os
+import time
 
 from celery import Celery
-from celery.schedules import crontab
-from django.conf import settings
+from celery.signals import (before_task_publish, task_failure, task_postrun,
+                            task_prerun, task_retry)
+
+from .metrics import registry
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'marketplace.settings')
 app = Celery('marketplace')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
-app.conf.beat_schedule = {
-    'replenish-everyday': {
-        'task': 'apps.products.tasks.replenish_stock_minimum',
-        'schedule': crontab(hour=0, minute=0),
-        'args': (10,),
-    },
-}
+# A agenda do Celery Beat fica em CELERY_BEAT_SCHEDULE (settings): este
+# módulo é importado por marketplace/__init__.py enquanto as settings ainda
+# carregam, então não pode lê-las na importação
+app.conf.timezone = 'America/Fortaleza'
+
+
+# Instrumentação das tasks: espera na fila, execução, retentativas, falhas e
+# vazão das importações, exportadas no mesmo /metrics da camada web
+IMPORT_TASKS = {'apps.products.tasks.import_parts_from_csv'}
+_started = {}
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    if headers is not None:
+        headers['enqueued_at'] = time.time()
+
+
+@task_prerun.connect
+def record_task_start(task_id=None, task=None, **kwargs):
+    _started[task_id] = time.perf_counter()
+    enqueued_at = getattr(task.request, 'enqueued_at', None)
+    if enqueued_at is not None:
+        registry.observe('celery_task_queue_wait_seconds', max(time.time() - enqueued_at, 0), task=task.name)
+
+
+@task_postrun.connect
+def record_task_end(task_id=None, task=None, retval=None, state=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is None:
+        return
+    runtime = time.perf_counter() - started
+    registry.observe('celery_task_runtime_seconds', runtime, task=task.name, state=state or '')
+
+    # Na importação em shards cada shard conta as próprias linhas
+    if task.name in IMPORT_TASKS and state == 'SUCCESS' and isinstance(retval, dict):
+        rows = retval.get('total', 0)
+        registry.inc('celery_task_rows_total', rows, task=task.name)
+        if runtime > 0:
+            registry.observe('celery_task_rows_per_second', rows / runtime, task=task.name)
+
+    # Workers podem ficar ociosos por muito tempo: publica ao fim de cada task
+    registry.flush()
+
+
+@task_retry.connect
+def record_task_retry(sender=None, **kwargs):
+    registry.inc('celery_task_retries_total', task=sender.name)
+
 
-app.conf.timezone = 'America/Fortaleza'
\ No newline at end of file
+@task_failure.connect
+def record_task_failure(sender=None, exception=None, **kwargs):
+    registry.inc('celery_task_failures_total', task=sender.name, exception=type(exception).__name__)
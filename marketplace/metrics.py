@@ -0,0 +1,321 @@
+import asyncio
+import math
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+INDEX_KEY = 'metrics:processes'
+SNAPSHOT_KEY = 'metrics:process:{}'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Tempos por fase da requisição corrente (auth, serialize, render...)
+_phases = ContextVar('metrics_phases', default=None)
+
+
+@contextmanager
+def timed(phase):
+    """
+    Soma a duração do bloco à fase ``phase`` da requisição corrente. Fora de
+    uma requisição instrumentada não faz nada.
+    """
+    phases = _phases.get()
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[phase] = phases.get(phase, 0.0) + time.perf_counter() - start
+
+
+def start_phases():
+    phases = {}
+    return phases, _phases.set(phases)
+
+
+def stop_phases(token):
+    _phases.reset(token)
+
+
+class Registry:
+    """
+    Métricas do processo no formato do Prometheus.
+
+    Cada processo (worker do gunicorn ou do Celery) acumula os valores em
+    memória e publica uma cópia no cache a cada ``METRICS_FLUSH_INTERVAL``
+    segundos; o endpoint ``/metrics`` soma as cópias de todos os processos
+    vivos. Registrar uma observação custa só uma atualização de dicionário;
+    dentro de um event loop a publicação roda em uma thread do executor.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.values = {}
+        self.lock = threading.Lock()
+        self.flushed_at = time.monotonic()
+        self.collectors = []
+
+    def counter(self, name, documentation, labelnames):
+        self.metrics[name] = ('counter', documentation, tuple(labelnames), None)
+
+    def gauge(self, name, documentation, labelnames):
+        self.metrics[name] = ('gauge', documentation, tuple(labelnames), None)
+
+    def histogram(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        self.metrics[name] = ('histogram', documentation, tuple(labelnames), tuple(buckets))
+
+    def collector(self, func):
+        """
+        Registra ``func(registry)``, chamada antes de cada publicação para
+        copiar valores mantidos fora do registro (ex.: pools de conexão).
+        """
+        self.collectors.append(func)
+        return func
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, self._labels(name, labels))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.maybe_flush()
+
+    def set(self, name, value, **labels):
+        key = (name, self._labels(name, labels))
+        with self.lock:
+            self.values[key] = value
+
+    def observe(self, name, value, **labels):
+        buckets = self.metrics[name][3]
+        key = (name, self._labels(name, labels))
+        with self.lock:
+            # [contagem por bucket (não acumulada)..., +Inf, soma]
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = [0] * (len(buckets) + 1) + [0.0]
+            index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            series[index] += 1
+            series[-1] += value
+        self.maybe_flush()
+
+    def _labels(self, name, labels):
+        return tuple(str(labels.get(label, '')) for label in self.metrics[name][2])
+
+    def maybe_flush(self):
+        if time.monotonic() - self.flushed_at < settings.METRICS_FLUSH_INTERVAL:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        # Sob ASGI o acesso ao cache bloquearia o event loop: a publicação
+        # vai para uma thread e o intervalo é reiniciado já, para não
+        # disparar uma publicação por requisição até ela terminar
+        self.flushed_at = time.monotonic()
+        loop.run_in_executor(None, self.flush)
+
+    def flush(self):
+        """
+        Publica os valores deste processo no cache e o registra no índice de
+        processos. O índice é reescrito a cada publicação, então uma entrada
+        perdida em escritas concorrentes volta na publicação seguinte.
+        """
+        self.flushed_at = time.monotonic()
+        for func in self.collectors:
+            try:
+                func(self)
+            except Exception:
+                pass
+        with self.lock:
+            snapshot = {key: list(value) if isinstance(value, list) else value
+                        for key, value in self.values.items()}
+
+        process = f'{socket.gethostname()}:{os.getpid()}'
+        ttl = settings.METRICS_PROCESS_TTL
+        now = time.time()
+        try:
+            cache.set(SNAPSHOT_KEY.format(process), snapshot, timeout=ttl)
+            index = cache.get(INDEX_KEY) or {}
+            index = {key: seen for key, seen in index.items() if now - seen < ttl}
+            index[process] = now
+            cache.set(INDEX_KEY, index, timeout=None)
+        except Exception:
+            # Métricas nunca devem derrubar a requisição ou a task
+            pass
+
+    def collect(self):
+        """
+        Soma as cópias publicadas por todos os processos vivos.
+        """
+        self.flush()
+        index = cache.get(INDEX_KEY) or {}
+        snapshots = cache.get_many([SNAPSHOT_KEY.format(process) for process in index])
+
+        totals = {}
+        for snapshot in snapshots.values():
+            for key, value in snapshot.items():
+                if isinstance(value, list):
+                    current = totals.setdefault(key, [0] * len(value))
+                    for i, item in enumerate(value):
+                        current[i] += item
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def render(self):
+        totals = self.collect()
+        lines = []
+        for name, (kind, documentation, labelnames, buckets) in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (metric, labels), value in sorted(totals.items()):
+                if metric != name:
+                    continue
+                pairs = [f'{label}="{_escape(item)}"' for label, item in zip(labelnames, labels)]
+                if kind != 'histogram':
+                    lines.append(f'{name}{_format_labels(pairs)} {_format_value(value)}')
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (math.inf,), value[:-1]):
+                    cumulative += count
+                    le = '+Inf' if bound == math.inf else _format_value(bound)
+                    bucket_labels = _format_labels(pairs + [f'le="{le}"'])
+                    lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(pairs)} {_format_value(value[-1])}')
+                lines.append(f'{name}_count{_format_labels(pairs)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = Registry()
+
+registry.histogram(
+    'http_request_duration_seconds',
+    'Tempo total da requisição por view.',
+    ['view', 'method'],
+)
+registry.histogram(
+    'http_request_queries',
+    'Queries executadas por requisição.',
+    ['view', 'method'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100),
+)
+registry.counter(
+    'http_request_phase_seconds_total',
+    'Tempo acumulado por fase da requisição (db, auth, serialize, render).',
+    ['view', 'phase'],
+)
+
+registry.histogram(
+    'celery_task_queue_wait_seconds',
+    'Tempo entre o envio da task e o início da execução no worker.',
+    ['task'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 15, 30, 60, 300, 900),
+)
+registry.histogram(
+    'celery_task_runtime_seconds',
+    'Tempo de execução da task.',
+    ['task', 'state'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 3600),
+)
+registry.counter(
+    'celery_task_retries_total',
+    'Tentativas reagendadas por task.',
+    ['task'],
+)
+registry.counter(
+    'celery_task_failures_total',
+    'Execuções que terminaram com erro.',
+    ['task', 'exception'],
+)
+registry.counter(
+    'celery_task_rows_total',
+    'Linhas processadas pelas tasks de importação.',
+    ['task'],
+)
+registry.histogram(
+    'celery_task_rows_per_second',
+    'Vazão (linhas/s) de cada execução das tasks de importação.',
+    ['task'],
+    buckets=(100, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000),
+)
+
+registry.gauge(
+    'db_pool_connections',
+    'Conexões do pool por estado (size = abertas, available = livres, max = limite).',
+    ['alias', 'state'],
+)
+registry.gauge(
+    'db_pool_requests_waiting',
+    'Requisições aguardando uma conexão livre do pool.',
+    ['alias'],
+)
+registry.counter(
+    'db_pool_checkouts_total',
+    'Conexões retiradas do pool.',
+    ['alias'],
+)
+registry.counter(
+    'db_pool_checkout_wait_seconds_total',
+    'Tempo acumulado esperando uma conexão livre do pool.',
+    ['alias'],
+)
+registry.counter(
+    'db_pool_checkout_errors_total',
+    'Retiradas que falharam (timeout ou pool fechado).',
+    ['alias'],
+)
+registry.counter(
+    'db_pool_connections_opened_total',
+    'Conexões abertas com o Postgres pelo pool.',
+    ['alias'],
+)
+registry.counter(
+    'db_pool_connections_lost_total',
+    'Conexões descartadas por falha na verificação de saúde.',
+    ['alias'],
+)
+
+
+def db_pool_stats():
+    """
+    Estatísticas dos pools de conexão deste processo, por alias do banco.
+    Aliases sem pool (``OPTIONS['pool']``) ficam de fora.
+    """
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is not None:
+            stats[alias] = pool.get_stats()
+    return stats
+
+
+@registry.collector
+def collect_db_pools(registry):
+    for alias, stats in db_pool_stats().items():
+        for state, key in (('size', 'pool_size'), ('available', 'pool_available'), ('max', 'pool_max')):
+            registry.set('db_pool_connections', stats.get(key, 0), alias=alias, state=state)
+        registry.set('db_pool_requests_waiting', stats.get('requests_waiting', 0), alias=alias)
+        registry.set('db_pool_checkouts_total', stats.get('requests_num', 0), alias=alias)
+        registry.set('db_pool_checkout_wait_seconds_total', stats.get('requests_wait_ms', 0) / 1000, alias=alias)
+        registry.set('db_pool_checkout_errors_total', stats.get('requests_errors', 0), alias=alias)
+        registry.set('db_pool_connections_opened_total', stats.get('connections_num', 0), alias=alias)
+        registry.set('db_pool_connections_lost_total', stats.get('connections_lost', 0), alias=alias)
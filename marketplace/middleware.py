@@ -0,0 +1,92 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .metrics import registry, start_phases, stop_phases
+
+
+class QueryTimer:
+    """
+    ``execute_wrapper`` que conta as queries e soma o tempo gasto no banco.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class PerformanceMiddleware:
+    """
+    Mede cada requisição (total, banco, autenticação, serialização e
+    renderização), devolve os tempos no cabeçalho ``Server-Timing`` e os
+    agrega nas métricas expostas em ``/metrics``, por nome de URL.
+
+    Funciona tanto sob WSGI quanto sob ASGI. No modo assíncrono as queries
+    rodam em threads do ORM, fora do alcance do ``execute_wrapper``; o tempo
+    de banco vem então da fase ``db`` medida pelas próprias views.
+
+    Desligado com ``METRICS_ENABLED=False``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        phases, token = start_phases()
+        timer = QueryTimer()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timer):
+                response = self.get_response(request)
+        finally:
+            stop_phases(token)
+        return self.record(request, response, phases, time.perf_counter() - start, timer)
+
+    async def __acall__(self, request):
+        phases, token = start_phases()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            stop_phases(token)
+        return self.record(request, response, phases, time.perf_counter() - start)
+
+    def record(self, request, response, phases, total, timer=None):
+        entries = [f'{phase};dur={duration * 1000:.2f}' for phase, duration in phases.items()]
+        if timer is not None:
+            phases['db'] = phases.get('db', 0.0) + timer.duration
+            entries.append(f'db;dur={timer.duration * 1000:.2f};desc="{timer.count} queries"')
+        entries.append(f'total;dur={total * 1000:.2f}')
+        response['Server-Timing'] = ', '.join(entries)
+
+        match = request.resolver_match
+        if match is None or match.url_name in ('metrics', 'db-pool'):
+            return response
+
+        view = match.url_name or match.view_name
+        registry.observe('http_request_duration_seconds', total, view=view, method=request.method)
+        if timer is not None:
+            registry.observe('http_request_queries', timer.count, view=view, method=request.method)
+        for phase, duration in phases.items():
+            registry.inc('http_request_phase_seconds_total', duration, view=view, phase=phase)
+        return response
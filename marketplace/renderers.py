@@ -0,0 +1,36 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import timed
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer que usa o orjson e produz os mesmos bytes do renderer padrão
+    do DRF (saída compacta em UTF-8). Indentação, JSON em ASCII ou tipos que o
+    orjson não conhece seguem pelo renderer padrão.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return self._render(data, accepted_media_type, renderer_context)
+
+    def _render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        encoder = self.encoder_class()
+        try:
+            ret = orjson.dumps(data, default=encoder.default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Mesmo escape de U+2028/U+2029 aplicado pelo JSONRenderer
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -14,6 +14,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from celery.schedules import crontab
 from decouple import config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,13 +44,16 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'drf_spectacular',
+    'marketplace',
     'apps.products',
 ]
 
 MIDDLEWARE = [
+    'marketplace.middleware.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -83,8 +87,12 @@ WSGI_APPLICATION = 'marketplace.wsgi.application'
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    'DEFAULT_RENDERER_CLASSES': (
+        'marketplace.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'marketplace.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
@@ -103,6 +111,55 @@ DATABASES = {
     }
 }
 
+# Pool de conexões do psycopg 3. Cada processo (worker do gunicorn ou do
+# Celery) mantém o próprio pool, então dimensione por serviço: o total de
+# processos x DB_POOL_MAX_SIZE precisa caber no max_connections do Postgres.
+# As conexões são testadas ao sair do pool e recicladas após DB_POOL_MAX_LIFETIME
+DB_POOL_ENABLED = config('DB_POOL_ENABLED', default=True, cast=bool)
+if DB_POOL_ENABLED:
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": config('DB_POOL_MIN_SIZE', default=1, cast=int),
+            "max_size": config('DB_POOL_MAX_SIZE', default=4, cast=int),
+            "timeout": config('DB_POOL_TIMEOUT', default=10, cast=float),
+            "max_idle": config('DB_POOL_MAX_IDLE', default=300, cast=float),
+            "max_lifetime": config('DB_POOL_MAX_LIFETIME', default=1800, cast=float),
+        },
+    }
+    # Com pool, o Django repassa a verificação ao psycopg (check_connection)
+    DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_URL", "redis://redis:6379/3"),
+    }
+}
+
+# Tempo (segundos) que listagens e detalhes de peças ficam em cache
+PARTS_CACHE_TIMEOUT = config('PARTS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Tempo (segundos) que o usuário autenticado pelo JWT fica em cache. Salvar
+# ou apagar o usuário remove a entrada na hora
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60, cast=int)
+
+# Serve as leituras de peças (listagem e detalhe) com views assíncronas.
+# Ative ao rodar sob ASGI (uvicorn); sob WSGI as views síncronas são melhores
+PARTS_ASYNC_VIEWS = config('PARTS_ASYNC_VIEWS', default=False, cast=bool)
+
+# Métricas de desempenho (cabeçalho Server-Timing e endpoint /metrics).
+# Cada processo publica suas métricas no cache a cada METRICS_FLUSH_INTERVAL
+# segundos; processos sem publicar há METRICS_PROCESS_TTL segundos saem da soma
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=float)
+METRICS_PROCESS_TTL = config('METRICS_PROCESS_TTL', default=120, cast=int)
+# Token exigido (Authorization: Bearer) para ler /metrics e /metrics/db-pool;
+# sem ele, apenas usuários staff autenticados no admin têm acesso
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -206,6 +263,9 @@ LOGGING = {
     },
 }
 
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')
+
 import sys
 
 if 'test' in sys.argv:
@@ -214,7 +274,76 @@ if 'test' in sys.argv:
         'level': 'ERROR',
         'propagate': False,
     }
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    # Tasks publicadas pelas views ficam em memória, sem Redis
+    CELERY_BROKER_URL = 'memory://'
+    CELERY_RESULT_BACKEND = 'cache+memory://'
 
 
-CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://redis:6379/0')
-CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://redis:6379/0')
+# Quantidade de linhas gravadas por transação na importação de planilhas
+PARTS_IMPORT_BATCH_SIZE = config('PARTS_IMPORT_BATCH_SIZE', default=1000, cast=int)
+
+# Intervalo, em linhas, entre as atualizações de progresso do ImportJob
+PARTS_IMPORT_PROGRESS_EVERY = config('PARTS_IMPORT_PROGRESS_EVERY', default=5000, cast=int)
+
+# Diretório (relativo ao MEDIA_ROOT) onde os uploads aguardam o worker
+PARTS_IMPORT_STAGING_DIR = 'imports'
+
+# Diretório (relativo ao MEDIA_ROOT) dos relatórios de erros das importações
+PARTS_IMPORT_REPORT_DIR = 'import-reports'
+
+# Quantidade máxima de peças atualizadas por transação na reposição de estoque
+PARTS_REPLENISH_CHUNK_SIZE = config('PARTS_REPLENISH_CHUNK_SIZE', default=5000, cast=int)
+
+# Reposição por peça: segundos entre a primeira escrita que deixa uma peça
+# abaixo do mínimo e a task (as escritas desse intervalo são agrupadas) e
+# intervalo da varredura periódica que cobre pedidos perdidos
+PARTS_REPLENISH_DELAY_SECONDS = config('PARTS_REPLENISH_DELAY_SECONDS', default=5, cast=int)
+PARTS_REPLENISH_SWEEP_SECONDS = config('PARTS_REPLENISH_SWEEP_SECONDS', default=60, cast=int)
+
+# Agenda a reposição a partir das escritas que deixam peças abaixo do
+# mínimo; desligado, só a varredura periódica repõe
+PARTS_REPLENISH_ON_WRITE = config('PARTS_REPLENISH_ON_WRITE', default=True, cast=bool)
+
+# Linhas lidas por vez do cursor no servidor durante a exportação do catálogo
+PARTS_EXPORT_CHUNK_SIZE = config('PARTS_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+
+# Feed de alterações (parts/changes/): itens por resposta (padrão e máximo)
+PARTS_CHANGES_PAGE_SIZE = config('PARTS_CHANGES_PAGE_SIZE', default=500, cast=int)
+PARTS_CHANGES_MAX_PAGE_SIZE = config('PARTS_CHANGES_MAX_PAGE_SIZE', default=5000, cast=int)
+
+# Dias que o registro de alterações do feed é mantido; cursores que ficaram
+# para trás das alterações apagadas precisam de uma sincronização completa
+PARTS_CHANGES_RETENTION_DAYS = config('PARTS_CHANGES_RETENTION_DAYS', default=30, cast=int)
+
+# Intervalo (segundos) da compactação do resumo do estoque (parts/stats/),
+# que junta as variações gravadas pelos triggers em uma única linha
+PARTS_INVENTORY_COMPACT_SECONDS = config('PARTS_INVENTORY_COMPACT_SECONDS', default=60, cast=int)
+
+# Linhas acumuladas no resumo a partir das quais a própria leitura compacta
+# (ex.: com o Celery Beat parado)
+PARTS_INVENTORY_MAX_ROWS = config('PARTS_INVENTORY_MAX_ROWS', default=1000, cast=int)
+
+# Tarefas periódicas (Celery Beat)
+CELERY_BEAT_SCHEDULE = {
+    'replenish-low-stock': {
+        'task': 'apps.products.tasks.replenish_low_stock',
+        'schedule': PARTS_REPLENISH_SWEEP_SECONDS,
+    },
+    'compact-inventory-summary': {
+        'task': 'apps.products.tasks.compact_inventory_summary',
+        'schedule': PARTS_INVENTORY_COMPACT_SECONDS,
+    },
+    'reconcile-inventory-summary': {
+        'task': 'apps.products.tasks.reconcile_inventory_summary',
+        'schedule': crontab(minute=15),
+    },
+    'purge-part-changes': {
+        'task': 'apps.products.tasks.purge_part_changes',
+        'schedule': crontab(hour=3, minute=0),
+    },
+}
@@ -21,7 +21,11 @@ from django.urls import include, path
 from django.views.generic import RedirectView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from .views import db_pool, metrics
+
 urlpatterns = [
+    path('metrics', metrics, name='metrics'),
+    path('metrics/db-pool', db_pool, name='db-pool'),
     path('marketplace/admin/', admin.site.urls),
     path('marketplace/api/v1/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('marketplace/api/v1/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -0,0 +1,68 @@
+import hmac
+import os
+import socket
+from functools import wraps
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+from .metrics import db_pool_stats, registry
+
+
+def metrics_access(view):
+    """
+    Restringe a view a quem envia ``Authorization: Bearer <METRICS_TOKEN>``
+    (o Prometheus) ou a usuários staff com sessão do admin. Sem
+    ``METRICS_TOKEN`` configurado, só staff tem acesso.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = settings.METRICS_TOKEN
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        if token and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode()):
+            return view(request, *args, **kwargs)
+        if request.user.is_active and request.user.is_staff:
+            return view(request, *args, **kwargs)
+        response = HttpResponse('Credenciais de métricas ausentes ou inválidas.', status=401)
+        response['WWW-Authenticate'] = 'Bearer realm="metrics"'
+        return response
+    return wrapper
+
+
+@metrics_access
+def metrics(request):
+    """
+    Métricas de todos os processos web e workers no formato texto do
+    Prometheus.
+    """
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@metrics_access
+def db_pool(request):
+    """
+    Uso do pool de conexões do processo que atendeu a requisição: conexões
+    abertas e livres, esperas e latência de retirada. A soma de todos os
+    processos está em ``/metrics`` (``db_pool_*``).
+    """
+    pools = {}
+    for alias, stats in db_pool_stats().items():
+        checkouts = stats.get('requests_num', 0)
+        opened = stats.get('connections_num', 0)
+        pools[alias] = {
+            'min_size': stats.get('pool_min', 0),
+            'max_size': stats.get('pool_max', 0),
+            'size': stats.get('pool_size', 0),
+            'available': stats.get('pool_available', 0),
+            'waiting': stats.get('requests_waiting', 0),
+            'checkouts': checkouts,
+            'checkouts_queued': stats.get('requests_queued', 0),
+            'checkout_errors': stats.get('requests_errors', 0),
+            'checkout_wait_ms_avg': round(stats.get('requests_wait_ms', 0) / checkouts, 3) if checkouts else 0,
+            'usage_ms_avg': round(stats.get('usage_ms', 0) / checkouts, 3) if checkouts else 0,
+            'connections_opened': opened,
+            'connect_ms_avg': round(stats.get('connections_ms', 0) / opened, 3) if opened else 0,
+            'connections_lost': stats.get('connections_lost', 0),
+            'returns_bad': stats.get('returns_bad', 0),
+        }
+    return JsonResponse({'process': f'{socket.gethostname()}:{os.getpid()}', 'pools': pools})